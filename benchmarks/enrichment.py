@@ -0,0 +1,167 @@
+"""Throughput and latency benchmarks against a local `MockIggyServer`.
+
+Measures rows/sec, p50/p99 request latency and peak traced memory of
+the raw `IggyAPI` client and of `IggyFeatureSet.enrich_dataframe`
+across concurrency levels:
+
+    python -m benchmarks.enrichment --rows 2000 --latency 0.02 --workers 1 8 32
+"""
+import argparse
+import random
+import statistics
+import subprocess
+import sys
+import time
+import tracemalloc
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List
+
+from iggyapi.api import IggyAPI
+from iggyapi.iggyfeature import (IggyAmenitiesScoreFeature, IggyFeatureSet,
+                                 IggyLookupFeature, IggyPOIFeature)
+
+
+def make_points(n: int, seed: int = 0) -> List:
+    """Random (longitude, latitude) points around Minneapolis"""
+    rng = random.Random(seed)
+    return [(-93.27 + rng.uniform(-0.1, 0.1), 44.97 + rng.uniform(-0.1, 0.1))
+            for _ in range(n)]
+
+
+def make_feature_set(api: IggyAPI) -> IggyFeatureSet:
+    return IggyFeatureSet([
+        IggyAmenitiesScoreFeature(api, within_minutes_driving=10),
+        IggyLookupFeature(api, "value", label="population_density_per_km"),
+        IggyLookupFeature(api, "value", label="air_quality"),
+        IggyPOIFeature(api, "min", label="grocery_stores", within_minutes_driving=5),
+        IggyPOIFeature(api, "count", label="bars", within_minutes_driving=5),
+    ])
+
+
+def _timed(api: IggyAPI, latencies: List) -> Callable:
+    enrich = api.enrich
+
+    def timed_enrich(*args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return enrich(*args, **kwargs)
+        finally:
+            latencies.append(time.perf_counter() - start)
+    return timed_enrich
+
+
+def _run(fn: Callable, rows: int, latencies: List, trace_memory: bool = True) -> Dict:
+    start = time.perf_counter()
+    fn()
+    elapsed = time.perf_counter() - start
+    latencies = sorted(latencies)
+    result = {
+        "rows_per_sec": rows / elapsed,
+        "requests": len(latencies),
+        "p50_ms": 1000 * statistics.median(latencies) if latencies else 0.0,
+        "p99_ms": 1000 * latencies[int(0.99 * (len(latencies) - 1))] if latencies else 0.0,
+        "peak_mb": float("nan"),
+    }
+    if trace_memory:
+        # tracing slows Python code down, so memory is measured in a
+        # separate run from the timings
+        tracemalloc.start()
+        fn()
+        result["peak_mb"] = tracemalloc.get_traced_memory()[1] / 1024 ** 2
+        tracemalloc.stop()
+    return result
+
+
+def bench_client(base_url: str, points: List, workers: int,
+                 trace_memory: bool = True) -> Dict:
+    """Raw `/lookup` calls, one per point"""
+    latencies = []
+    with IggyAPI("benchmark", base_url=base_url, pool_size=workers) as api:
+        api.enrich = _timed(api, latencies)
+
+        def call(point):
+            return api.lookup({"params": {"longitude": point[0], "latitude": point[1],
+                                          "labels": "population_density_per_km"}})
+
+        def run():
+            with ThreadPoolExecutor(max_workers=workers) as executor:
+                list(executor.map(call, points))
+        return _run(run, len(points), latencies, trace_memory)
+
+
+def bench_enrich_dataframe(base_url: str, points: List, workers: int,
+                           trace_memory: bool = True) -> Dict:
+    """`IggyFeatureSet.enrich_dataframe` over a pandas DataFrame"""
+    import pandas as pd
+    df = pd.DataFrame(points, columns=["lng", "lat"])
+    latencies = []
+    with IggyAPI("benchmark", base_url=base_url, pool_size=workers) as api:
+        api.enrich = _timed(api, latencies)
+        feature_set = make_feature_set(api)
+        return _run(lambda: feature_set.enrich_dataframe(
+            df, longitude_col="lng", latitude_col="lat", max_workers=workers),
+            len(points), latencies, trace_memory)
+
+
+BENCHMARKS = {
+    "client": bench_client,
+    "enrich_dataframe": bench_enrich_dataframe,
+}
+
+
+class _ServerProcess():
+    """`MockIggyServer` in a child process, so that its CPU time and
+    allocations do not distort the measurements of the client"""
+    def __init__(self, latency: float, jitter: float, error_rate: float):
+        self.args = [sys.executable, "-m", "iggyapi.mockserver", "--port", "0",
+                     "--latency", str(latency), "--jitter", str(jitter),
+                     "--error-rate", str(error_rate)]
+
+    def __enter__(self) -> str:
+        self.process = subprocess.Popen(self.args, stdout=subprocess.PIPE, text=True)
+        return self.process.stdout.readline().strip()
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.process.terminate()
+        self.process.wait()
+
+
+def run_benchmarks(rows: int = 500, workers: List = (1, 8, 32), latency: float = 0.01,
+                   jitter: float = 0.0, error_rate: float = 0.0,
+                   benchmarks: List = tuple(BENCHMARKS),
+                   trace_memory: bool = True) -> List[Dict]:
+    """Run each benchmark at each concurrency level and return result rows"""
+    points = make_points(rows)
+    results = []
+    with _ServerProcess(latency, jitter, error_rate) as base_url:
+        for name in benchmarks:
+            for n_workers in workers:
+                result = BENCHMARKS[name](base_url, points, n_workers, trace_memory)
+                results.append(dict(benchmark=name, workers=n_workers, **result))
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=500)
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 8, 32])
+    parser.add_argument("--latency", type=float, default=0.01)
+    parser.add_argument("--jitter", type=float, default=0.0)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--benchmarks", nargs="+", default=list(BENCHMARKS),
+                        choices=list(BENCHMARKS))
+    parser.add_argument("--no-memory", action="store_true",
+                        help="skip the memory-tracing pass")
+    args = parser.parse_args()
+
+    print(f"{'benchmark':<18} {'workers':>7} {'rows/s':>10} {'requests':>9} "
+          f"{'p50 ms':>8} {'p99 ms':>8} {'peak MB':>8}")
+    for r in run_benchmarks(args.rows, args.workers, args.latency, args.jitter,
+                            args.error_rate, args.benchmarks, not args.no_memory):
+        print(f"{r['benchmark']:<18} {r['workers']:>7} {r['rows_per_sec']:>10.1f} "
+              f"{r['requests']:>9} {r['p50_ms']:>8.1f} {r['p99_ms']:>8.1f} "
+              f"{r['peak_mb']:>8.1f}")
+
+
+if __name__ == "__main__":
+    main()
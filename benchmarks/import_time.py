@@ -0,0 +1,49 @@
+"""Import-time benchmark for `iggyapi` modules.
+
+Each module is imported in a fresh interpreter several times and the
+median wall time is reported. With `--max-ms`, exits non-zero when any
+module exceeds the budget, so it can guard against regressions in CI:
+
+    python -m benchmarks.import_time --max-ms 400
+"""
+import argparse
+import statistics
+import subprocess
+import sys
+
+MODULES = ["iggyapi.api", "iggyapi.iggyfeature"]
+
+SNIPPET = (
+    "import time; t = time.perf_counter(); import {module}; "
+    "print((time.perf_counter() - t) * 1000)"
+)
+
+
+def import_time_ms(module: str, repeat: int = 5) -> float:
+    """Median time in milliseconds to import `module` in a new interpreter"""
+    times = []
+    for _ in range(repeat):
+        out = subprocess.run([sys.executable, "-c", SNIPPET.format(module=module)],
+                             check=True, capture_output=True, text=True).stdout
+        times.append(float(out))
+    return statistics.median(times)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--max-ms", type=float, default=None,
+                        help="fail if any module takes longer to import")
+    args = parser.parse_args()
+
+    failed = False
+    for module in MODULES:
+        ms = import_time_ms(module, args.repeat)
+        print(f"{module:<24} {ms:8.1f} ms")
+        if args.max_ms is not None and ms > args.max_ms:
+            failed = True
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,9 +1,102 @@
 import requests
 import json
-from typing import Dict, Union
-import geopandas as gpd
-import matplotlib.pyplot as plt
-import contextily as ctx
+import logging
+import os
+import pickle
+import threading
+import time
+import uuid
+from requests.adapters import HTTPAdapter
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+from typing import TYPE_CHECKING, Callable, Dict, List, Optional, Sequence, Tuple, Union
+
+from iggyapi.cache import ResponseCache
+from iggyapi.metrics import Metrics
+from iggyapi.ratelimit import HedgePolicy, RateLimiter, RetryPolicy, parse_retry_after
+
+# geopandas, matplotlib and contextily are slow to import and only needed
+# for GeoDataFrame conversion and plotting, so they are imported on use.
+if TYPE_CHECKING:
+    import geopandas as gpd
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BASE_URL = "https://api.askiggy.com/v1/"
+DEFAULT_POOL_SIZE = 10
+# (connect, read) timeouts in seconds
+DEFAULT_TIMEOUT = (3.05, 30)
+
+
+def _load_api(cls, origin: int, payload: bytes) -> "IggyAPI":
+    """Unpickle a client. In a process other than the one it was pickled
+    in, such as a pool worker, each client is only unpickled once, so that
+    all the tasks the worker runs share its connection pool."""
+    if origin == os.getpid():
+        return _new_api(cls, payload)
+    return _shared_api(cls, payload)
+
+
+def _new_api(cls, payload: bytes) -> "IggyAPI":
+    api = cls.__new__(cls)
+    api.__setstate__(pickle.loads(payload))
+    return api
+
+
+_shared_api = lru_cache(maxsize=16)(_new_api)
+
+
+def clusters_to_gdf(response: Dict) -> "gpd.GeoDataFrame":
+    """Convert a raw `/clusters` response into a GeoDataFrame.
+
+    This function has no side effects, so it can safely be run in a
+    worker thread (e.g. from `AsyncIggyAPI`).
+    """
+    import geopandas as gpd
+    names = [c["summary"]["place_names"] for c in response["clusters"]]
+    geoms = [c["geojson"] for c in response["clusters"]]
+    gdf = gpd.GeoDataFrame.from_features(geoms)
+    gdf["names"] = names
+    gdf.crs = {"init": "epsg:4326"}
+    return gdf
+
+
+def isochrone_to_gdf(response: Dict) -> "gpd.GeoDataFrame":
+    """Convert a raw `/isochrone` response into a GeoDataFrame.
+
+    This function has no side effects, so it can safely be run in a
+    worker thread (e.g. from `AsyncIggyAPI`).
+    """
+    import geopandas as gpd
+    gdf = gpd.GeoDataFrame.from_features([response])
+    gdf.crs = {"init": "epsg:4326"}
+    return gdf
+
+
+def isochrones_to_gdf(responses: List[Dict], origin_ids: Sequence) -> "gpd.GeoDataFrame":
+    """Convert raw `/isochrone` responses for many origins into a single
+    GeoDataFrame with an `origin_id` column.
+
+    Error responses produce a row with an empty geometry.
+    """
+    import geopandas as gpd
+    features = []
+    for origin_id, response in zip(origin_ids, responses):
+        if "message" in response:
+            logger.error(f"Error API response for origin {origin_id}: {response['message']}")
+            features.append({"type": "Feature", "geometry": None,
+                             "properties": {"origin_id": origin_id}})
+        else:
+            properties = dict(response.get("properties") or {}, origin_id=origin_id)
+            features.append(dict(response, properties=properties))
+    if not features:
+        return gpd.GeoDataFrame({"origin_id": []}, geometry=[], crs="EPSG:4326")
+    return gpd.GeoDataFrame.from_features(features, crs="EPSG:4326")
+
+
+def _past(deadline: float, delay: float) -> bool:
+    """Whether waiting `delay` seconds would reach `deadline`"""
+    return deadline is not None and time.monotonic() + delay >= deadline
 
 
 class IggyAPI():
@@ -15,31 +108,168 @@ class IggyAPI():
         A string representing the token of the Iggy User.
         See your user dashboard at `https://www.askiggy.com/dashboard`
         to find your API token.
+    session : requests.Session, optional
+        Transport used for all requests. Any object exposing the
+        `requests.Session` interface (`get`, `post`, `close`) can be
+        plugged in. If omitted, a pooled keep-alive session is created
+        and owned by this object.
+    pool_size : int
+        Maximum number of pooled connections kept alive per host when
+        the session is created by IggyAPI.
+    timeout : float or tuple of (float, float)
+        Per-request timeout in seconds, either a single value or a
+        `(connect, read)` tuple.
+    endpoint_timeouts : dict, optional
+        Per-endpoint overrides of `timeout`, e.g.
+        `{"isochrone": (3.05, 60)}`.
+    cache : ResponseCache, optional
+        Persistent response cache consulted before every request.
+        Error responses are never cached.
+    rate_limiter : RateLimiter, optional
+        Token bucket every request must pass through, typically matched
+        to the plan quota.
+    retry : RetryPolicy, optional
+        How throttled (429), failed (5xx) and dropped requests are
+        retried. Defaults to `RetryPolicy()`; pass `None` to disable.
+    base_url : str
+        Root URL of the API, e.g. to point at a `MockIggyServer`.
+    hedge : HedgePolicy, optional
+        If given, slow GET requests are hedged: a duplicate is sent from
+        a small thread pool once a request has taken longer than a
+        quantile of its endpoint's latency. The request itself is sent on
+        the calling thread, which waits for it; the duplicate's response
+        is used if the request fails, e.g. times out.
+
+    Per-endpoint request counts, errors, latencies, response sizes,
+    retries and cache hits are recorded in `metrics` (see `Metrics`),
+    and callbacks can be attached to each request with `add_hook`.
+
+    IggyAPI can be used as a context manager, in which case the
+    connection pool is released on exit:
+
+        with IggyAPI("<token>") as myapi:
+            myapi.lookup(options)
+
+    IggyAPI objects can be pickled, e.g. to be sent to worker processes.
+    The copy opens its own connection pool (unless a session was passed
+    in) and starts with empty `metrics`; hooks must be picklable too.
     """
 
-    def __init__(self, api_token: str):
+    def __init__(self, api_token: str, session: requests.Session = None,
+                 pool_size: int = DEFAULT_POOL_SIZE,
+                 timeout: Union[float, Tuple[float, float]] = DEFAULT_TIMEOUT,
+                 cache: ResponseCache = None, rate_limiter: RateLimiter = None,
+                 retry: RetryPolicy = RetryPolicy(),
+                 base_url: str = DEFAULT_BASE_URL, endpoint_timeouts: Dict = None,
+                 hedge: HedgePolicy = None):
         self.api_token = api_token
-        self.base_url = "https://api.askiggy.com/v1/"
+        self.base_url = base_url
         self.headers = {
             "Accept": "application/json",
             "Content-Type": "application/json",
             "X-Iggy-Token": self.api_token,
         }
+        self.timeout = timeout
+        self.endpoint_timeouts = endpoint_timeouts or {}
+        self.pool_size = pool_size
+        self._owns_session = session is None
+        self.session = session if session is not None else self._create_session()
+        self.cache = cache
+        self.rate_limiter = rate_limiter
+        self.retry = retry
+        self.hedge = hedge
+        self._hedge_pool = None
+        self._hedge_lock = threading.Lock()
+        self.metrics = Metrics()
+        self.hooks = {"pre_request": [], "post_response": []}
         self.last_clusters = None
         self.last_isochrone = None
+        # tells clients apart when they are shared by a worker, see _load_api
+        self._token = uuid.uuid4().hex
+
+    def _create_session(self) -> requests.Session:
+        session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=self.pool_size,
+                              pool_maxsize=self.pool_size)
+        session.mount("https://", adapter)
+        session.mount("http://", adapter)
+        session.headers.update(self.headers)
+        return session
+
+    def add_hook(self, event: str, hook: Callable):
+        """Register a callback run around every HTTP attempt.
+
+        `pre_request` hooks are called with keyword arguments `endpoint`,
+        `method`, `params`, `body` and `attempt` (0 for the first try)
+        before a request is sent. `post_response` hooks additionally get
+        `status_code` (None if no response was received), `elapsed`
+        seconds, `response_bytes` and `error` (the exception raised by
+        the transport, if any). Hooks should accept `**kwargs`, as more
+        arguments may be added. Exceptions raised by hooks are logged
+        and ignored.
+
+        :param event: str
+            `pre_request` or `post_response`
+        :param hook: callable
+        :return: None
+        """
+        if event not in self.hooks:
+            logger.error(f"Unsupported hook event: {event}")
+            raise ValueError
+        self.hooks[event].append(hook)
+
+    def _run_hooks(self, event: str, **kwargs):
+        for hook in self.hooks[event]:
+            try:
+                hook(**kwargs)
+            except Exception:
+                logger.exception(f"Error in {event} hook")
+
+    def close(self):
+        """Release pooled connections.
+
+        A session passed in by the caller is left open, since it may be
+        shared with other clients.
+        """
+        if self._owns_session:
+            self.session.close()
+        with self._hedge_lock:
+            if self._hedge_pool is not None:
+                self._hedge_pool.shutdown(wait=False)
+                self._hedge_pool = None
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        if self._owns_session:
+            state["session"] = None
+        state["metrics"] = None
+        state["_hedge_pool"] = None
+        del state["_hedge_lock"]
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        if self.session is None:
+            self.session = self._create_session()
+        self.metrics = Metrics()
+        self._hedge_lock = threading.Lock()
+
+    def __reduce__(self):
+        return _load_api, (type(self), os.getpid(), pickle.dumps(self.__getstate__()))
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
 
     def _convert_clusters_to_gdf_res(self, response: Dict):
-        names = [c["summary"]["place_names"] for c in response["clusters"]]
-        geoms = [c["geojson"] for c in response["clusters"]]
-        gdf = gpd.GeoDataFrame.from_features(geoms)
-        gdf["names"] = names
-        gdf.crs = {"init": "epsg:4326"}
+        gdf = clusters_to_gdf(response)
         self.last_clusters = gdf
         return gdf
 
     def _create_isochrone_gdf(self, response: Dict):
-        gdf = gpd.GeoDataFrame.from_features([response])
-        gdf.crs = {"init": "epsg:4326"}
+        gdf = isochrone_to_gdf(response)
         self.last_isochrone = gdf
         return gdf
 
@@ -58,13 +288,17 @@ class IggyAPI():
             print("Endpoint not yet supported")
             return
 
+        import contextily as ctx
+        import matplotlib.pyplot as plt
+
         ax = gdf.plot(edgecolor="k", alpha=0.5)
         ctx.add_basemap(
             ax, zoom=16, source=ctx.providers.Stamen.TonerLite, crs=gdf.crs)
         ax.set_axis_off()
         plt.show()
 
-    def enrich(self, endpoint: str, options: Dict, body: Dict = {}) -> Dict:
+    def enrich(self, endpoint: str, options: Dict, body: Dict = {},
+               deadline: float = None) -> Dict:
         """Generic method to execute a call to the Iggy API
 
         :param endpoint: str
@@ -74,20 +308,184 @@ class IggyAPI():
             See the API documentation for details
         :param body: dict
             For POST requests, the body of the request
+        :param deadline: float, optional
+            `time.monotonic()` time by which the call, including retries,
+            must be done. Timeouts are shortened to fit and no retry is
+            started that would end past it; `requests.Timeout` is raised
+            if it passes before a request could be sent.
         :return: dict
         """
         method = options.get("method") or "GET"
         params = options.get("params")
-        requestURL = self.base_url + endpoint
 
+        use_cache = self.cache is not None and self.cache.enabled_for(endpoint)
+        if use_cache:
+            key = self.cache.make_key(endpoint, method, params, body)
+            cached = self.cache.get(endpoint, key)
+            if cached is not None:
+                self.metrics.increment(endpoint, "cache_hits")
+                return cached
+            self.metrics.increment(endpoint, "cache_misses")
+
+        response = self._request(endpoint, method, params, body, deadline)
+        if use_cache and not (isinstance(response, dict) and "message" in response):
+            self.cache.set(endpoint, key, response)
+        return response
+
+    def _request(self, endpoint: str, method: str, params: Dict, body: Dict,
+                 deadline: float = None) -> Dict:
+        requestURL = self.base_url + endpoint
+        retry = self.retry or RetryPolicy(max_retries=0)
+        attempt = 0
+        while True:
+            if self.rate_limiter is not None:
+                self.rate_limiter.acquire()
+            timeout = self._timeout(endpoint, deadline)
+            try:
+                r = self._send_instrumented(endpoint, method, requestURL,
+                                            params, body, attempt, timeout)
+            except (requests.ConnectionError, requests.Timeout) as e:
+                delay = retry.delay(attempt)
+                if attempt >= retry.max_retries or _past(deadline, delay):
+                    self.metrics.increment(endpoint, "failures")
+                    raise
+                logger.warning(f"Retrying /{endpoint} after error: {e}")
+            else:
+                if r.status_code not in retry.retry_statuses:
+                    if self.rate_limiter is not None:
+                        self.rate_limiter.recover()
+                    return self._parse_response(r)
+                retry_after = parse_retry_after(r.headers.get("Retry-After"))
+                if r.status_code == 429:
+                    self.metrics.increment(endpoint, "throttled")
+                    if self.rate_limiter is not None:
+                        self.rate_limiter.throttle(retry_after)
+                delay = retry.delay(attempt, retry_after)
+                if attempt >= retry.max_retries or _past(deadline, delay):
+                    self.metrics.increment(endpoint, "failures")
+                    return self._parse_response(r)
+                logger.warning(f"Retrying /{endpoint} after HTTP {r.status_code}")
+            attempt += 1
+            self.metrics.increment(endpoint, "retries")
+            time.sleep(delay)
+
+    def _timeout(self, endpoint: str, deadline: float = None):
+        """Timeout of a request to `endpoint`, shortened to end by `deadline`"""
+        timeout = self.endpoint_timeouts.get(endpoint, self.timeout)
+        if deadline is None:
+            return timeout
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            self.metrics.increment(endpoint, "failures")
+            raise requests.Timeout(f"Deadline exceeded for /{endpoint}")
+        if isinstance(timeout, tuple):
+            return tuple(min(t, remaining) for t in timeout)
+        return remaining if timeout is None else min(timeout, remaining)
+
+    def _send_instrumented(self, endpoint: str, method: str, url: str, params: Dict,
+                           body: Dict, attempt: int, timeout=None) -> requests.Response:
+        info = dict(endpoint=endpoint, method=method, params=params, body=body,
+                    attempt=attempt)
+        self._run_hooks("pre_request", **info)
+        start = time.perf_counter()
+        try:
+            r = self._send_hedged(endpoint, method, url, params, body, timeout)
+        except Exception as e:
+            elapsed = time.perf_counter() - start
+            self.metrics.record_response(endpoint, type(e).__name__, elapsed)
+            self._run_hooks("post_response", status_code=None, elapsed=elapsed,
+                            response_bytes=0, error=e, **info)
+            raise
+        elapsed = time.perf_counter() - start
+        response_bytes = len(r.content or b"")
+        self.metrics.record_response(endpoint, r.status_code, elapsed, response_bytes)
+        self._run_hooks("post_response", status_code=r.status_code, elapsed=elapsed,
+                        response_bytes=response_bytes, error=None, **info)
+        return r
+
+    def _send_hedged(self, endpoint: str, method: str, url: str, params: Dict,
+                     body: Dict, timeout=None) -> requests.Response:
+        """Send a request on the calling thread and, for a GET still
+        unanswered after the hedge delay, an identical one from the hedge
+        pool; the duplicate's response is used if the first request fails"""
+        delay = None
+        if self.hedge is not None and method == "GET":
+            delay = self.hedge.delay(endpoint, self.metrics.latency(endpoint))
+        if delay is None:
+            return self._send(method, url, params, body, timeout)
+        answered = threading.Event()
+        due = time.monotonic() + delay
+
+        def duplicate():
+            if answered.wait(max(0.0, due - time.monotonic())):
+                return None
+            self.metrics.increment(endpoint, "hedged")
+            if self.rate_limiter is not None:
+                self.rate_limiter.acquire()
+            return self._send(method, url, params, body, timeout)
+
+        hedge = self._hedge_executor().submit(duplicate)
+        retry_statuses = (self.retry or RetryPolicy(max_retries=0)).retry_statuses
+        try:
+            r = self._send(method, url, params, body, timeout)
+        except (requests.ConnectionError, requests.Timeout):
+            answered.set()
+            r = self._hedge_result(endpoint, hedge, retry_statuses)
+            if r is None:
+                raise
+            return r
+        answered.set()
+        if r.status_code in retry_statuses:
+            return self._hedge_result(endpoint, hedge, retry_statuses) or r
+        return r
+
+    def _hedge_result(self, endpoint: str, hedge, retry_statuses: Tuple) \
+            -> Optional[requests.Response]:
+        """Successful response of a duplicate request that was sent, if any"""
+        try:
+            r = hedge.result()
+        except (requests.ConnectionError, requests.Timeout):
+            return None
+        if r is None or r.status_code in retry_statuses:
+            return None
+        self.metrics.increment(endpoint, "hedge_wins")
+        return r
+
+    def _hedge_executor(self) -> ThreadPoolExecutor:
+        """Thread pool running hedged requests, created on first use"""
+        with self._hedge_lock:
+            if self._hedge_pool is None:
+                self._hedge_pool = ThreadPoolExecutor(max_workers=2 * self.pool_size,
+                                                      thread_name_prefix="iggy-hedge")
+            return self._hedge_pool
+
+    def _send(self, method: str, url: str, params: Dict, body: Dict,
+              timeout=None) -> requests.Response:
+        timeout = self.timeout if timeout is None else timeout
         if (method == "GET"):
-            r = requests.get(requestURL, params=params, headers=self.headers)
-            return r.json()
+            return self.session.get(url, params=params,
+                                    headers=self.headers, timeout=timeout)
 
         elif (method == "POST"):
-            r = requests.post(requestURL, data=json.dumps(
-                body), headers=self.headers)
-            return r.json()
+            return self.session.post(url, params=params, data=json.dumps(body),
+                                     headers=self.headers, timeout=timeout)
+
+        logger.error(f"Unsupported method: {method}")
+        raise ValueError
+
+    def _parse_response(self, r: requests.Response) -> Dict:
+        """Decode response JSON, turning HTTP errors into a `message` dict"""
+        try:
+            response = r.json()
+        except ValueError:
+            response = None
+        if r.ok and response is not None:
+            return response
+        if not isinstance(response, dict):
+            response = {}
+        response.setdefault("message", f"HTTP {r.status_code}: {r.reason}")
+        response.setdefault("status_code", r.status_code)
+        return response
 
     def lookup(self, options: Dict) -> Dict:
         """Call `/lookup` endpoint
@@ -119,7 +517,7 @@ class IggyAPI():
         return self.enrich("lookup", options)
 
     def isochrone(self, options: Dict, raw_response: bool = False) \
-            -> Union[gpd.GeoDataFrame,Dict]:
+            -> Union["gpd.GeoDataFrame", Dict]:
         """Call `/isochrone` endpoint
 
         This endpoint returns a polygon representing the area traversable
@@ -158,7 +556,56 @@ class IggyAPI():
         else:
             return self._create_isochrone_gdf(self.enrich("isochrone", options))
 
-    def points_of_interest(self, options: Dict, body: Dict = {}) -> Dict:
+    def isochrones(self, points: Sequence[Tuple[float, float]], mode: str,
+                   minutes: float, ids: Sequence = None,
+                   max_workers: int = DEFAULT_POOL_SIZE) -> "gpd.GeoDataFrame":
+        """Call `/isochrone` endpoint for many origins at once
+
+        Requests are made concurrently and the results are combined into
+        one GeoDataFrame, with one row per origin and an `origin_id`
+        column. Origins whose request failed, including with a connection
+        error, get an empty geometry. Unlike `isochrone`, this does not update
+        `last_isochrone`, so it is safe to call from several threads.
+
+        :param points: sequence of (longitude, latitude) tuples
+        :param mode: str
+            One of `driving`, `biking` or `walking`
+        :param minutes: float
+            Travel time from each origin
+        :param ids: sequence, optional
+            Origin identifiers, in the same order as `points`.
+            Defaults to the position of each point.
+        :param max_workers: int
+            Maximum number of concurrent requests
+
+        :return: gpd.GeoDataFrame
+        """
+        if mode not in ("driving", "biking", "walking"):
+            logger.error(f"Unsupported mode: {mode}")
+            raise ValueError
+        ids = list(range(len(points))) if ids is None else list(ids)
+        if len(ids) != len(points):
+            logger.error("`ids` and `points` must have the same length")
+            raise ValueError
+
+        def fetch(point):
+            longitude, latitude = point
+            try:
+                return self.enrich("isochrone", {"params": {
+                    "latitude": latitude,
+                    "longitude": longitude,
+                    f"within_minutes_{mode}": minutes,
+                }})
+            except requests.RequestException as e:
+                # one unreachable origin must not discard the others
+                return {"message": f"{type(e).__name__}: {e}", "status_code": None}
+
+        with ThreadPoolExecutor(max_workers=max(1, max_workers)) as executor:
+            responses = list(executor.map(fetch, points))
+        return isochrones_to_gdf(responses, ids)
+
+    def points_of_interest(self, options: Dict, body: Dict = {},
+                           deadline: float = None) -> Dict:
         """Call to `/points_of_interest` endpoint
 
         This endpoint returns the names of POIs within a given distance
@@ -192,17 +639,20 @@ class IggyAPI():
 
         Alternatively, this request can be made using POST and a geojson
         object as the body to get the points of interest within an input
-        polygon. For example:
+        polygon. `labels` or `brands` are still passed in `params`. For
+        example:
 
-        options = {'method': 'POST', 'parms': {'labels': 'book_stores'}}
+        options = {'method': 'POST', 'params': {'labels': 'book_stores'}}
         body = {'type': 'Feature', 'properties': {}, 'geometry': {...}}
 
         :param options: dict
         :param body: dict
             GeoJSON object, to be used with POST
+        :param deadline: float, optional
+            See `enrich`
         :return: dict
         """
-        return self.enrich("points_of_interest", options, body)
+        return self.enrich("points_of_interest", options, body, deadline)
 
     def amenities_score(self, options: Dict) -> Dict:
         """Call `/amenities_score` endpoint
@@ -238,7 +688,7 @@ class IggyAPI():
         return self.enrich("amenities_score", options)
 
     def clusters(self, options: Dict, raw_response: bool = False) \
-            -> Union[gpd.GeoDataFrame,Dict]:
+            -> Union["gpd.GeoDataFrame", Dict]:
         """Call `/clusters` endpoint
 
         This endpoint returns a set of clusters (polygons) comprising
@@ -0,0 +1,199 @@
+import asyncio
+import json
+import logging
+from typing import TYPE_CHECKING, Dict, Tuple, Union
+
+from iggyapi.api import DEFAULT_BASE_URL, DEFAULT_TIMEOUT, clusters_to_gdf, isochrone_to_gdf
+
+if TYPE_CHECKING:
+    import geopandas as gpd
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MAX_IN_FLIGHT = 100
+
+
+class AsyncIggyAPI():
+    """Asyncio implementation of the Iggy API in python
+
+    Mirrors the endpoint methods of `IggyAPI` as coroutines. Requires
+    the optional `aiohttp` dependency (`pip install iggyapi[async]`).
+
+    Parameters
+    ----------
+    api_token : str
+        A string representing the token of the Iggy User.
+    session : aiohttp.ClientSession, optional
+        Transport used for all requests. If omitted, a pooled session
+        is created on first use and owned by this object.
+    max_in_flight : int
+        Maximum number of concurrent requests. Bounds both the
+        connection pool and a semaphore guarding every call.
+    timeout : float or tuple of (float, float)
+        Per-request timeout in seconds, either a single total value or
+        a `(connect, read)` tuple.
+    base_url : str
+        Root URL of the API
+
+    Usage:
+
+        async with AsyncIggyAPI("<token>") as myapi:
+            results = await asyncio.gather(
+                *[myapi.lookup(o) for o in options_list])
+    """
+
+    def __init__(self, api_token: str, session=None,
+                 max_in_flight: int = DEFAULT_MAX_IN_FLIGHT,
+                 timeout: Union[float, Tuple[float, float]] = DEFAULT_TIMEOUT,
+                 base_url: str = DEFAULT_BASE_URL):
+        self.api_token = api_token
+        self.base_url = base_url
+        self.headers = {
+            "Accept": "application/json",
+            "Content-Type": "application/json",
+            "X-Iggy-Token": self.api_token,
+        }
+        self.timeout = timeout
+        self.max_in_flight = max_in_flight
+        self._owns_session = session is None
+        self.session = session
+        self._semaphore = asyncio.Semaphore(max_in_flight)
+
+    def _create_session(self):
+        try:
+            import aiohttp
+        except ImportError:
+            raise ImportError(
+                "AsyncIggyAPI requires `aiohttp`: pip install iggyapi[async]")
+        if isinstance(self.timeout, tuple):
+            connect, read = self.timeout
+            timeout = aiohttp.ClientTimeout(sock_connect=connect, sock_read=read)
+        else:
+            timeout = aiohttp.ClientTimeout(total=self.timeout)
+        connector = aiohttp.TCPConnector(limit=self.max_in_flight)
+        return aiohttp.ClientSession(connector=connector, headers=self.headers,
+                                     timeout=timeout)
+
+    async def close(self):
+        """Release pooled connections (only if the session is owned)."""
+        if self._owns_session and self.session is not None:
+            await self.session.close()
+            self.session = None
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc_value, traceback):
+        await self.close()
+
+    async def enrich(self, endpoint: str, options: Dict, body: Dict = {}) -> Dict:
+        """Generic coroutine to execute a call to the Iggy API
+
+        See `IggyAPI.enrich` for a description of the parameters. As
+        there, HTTP errors are returned as a dict with `message` and
+        `status_code`.
+
+        :return: dict
+        """
+        if self.session is None:
+            self.session = self._create_session()
+        method = options.get("method") or "GET"
+        params = options.get("params")
+        requestURL = self.base_url + endpoint
+
+        async with self._semaphore:
+            if (method == "GET"):
+                async with self.session.get(requestURL, params=params,
+                                            headers=self.headers) as r:
+                    return await self._parse_response(r)
+
+            elif (method == "POST"):
+                async with self.session.post(requestURL, params=params,
+                                             data=json.dumps(body),
+                                             headers=self.headers) as r:
+                    return await self._parse_response(r)
+
+        logger.error(f"Unsupported method: {method}")
+        raise ValueError
+
+    async def _parse_response(self, r) -> Dict:
+        """Decode response JSON, turning HTTP errors into a `message` dict"""
+        try:
+            # skip aiohttp's content type check: error pages may be HTML
+            response = await r.json(content_type=None)
+        except ValueError:
+            response = None
+        if r.ok and response is not None:
+            return response
+        if not isinstance(response, dict):
+            response = {}
+        response.setdefault("message", f"HTTP {r.status}: {r.reason}")
+        response.setdefault("status_code", r.status)
+        return response
+
+    async def _to_gdf(self, convert, response: Dict) -> "gpd.GeoDataFrame":
+        # GeoDataFrame construction is CPU bound; keep it off the event loop
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(None, convert, response)
+
+    async def lookup(self, options: Dict) -> Dict:
+        """Call `/lookup` endpoint. See `IggyAPI.lookup`.
+
+        :param options: dict
+        :return: dict
+        """
+        return await self.enrich("lookup", options)
+
+    async def isochrone(self, options: Dict, raw_response: bool = False) \
+            -> Union["gpd.GeoDataFrame", Dict]:
+        """Call `/isochrone` endpoint. See `IggyAPI.isochrone`.
+
+        :param options: dict
+        :param raw_response: bool
+
+        :return: gpd.GeoDataFrame or dict
+        """
+        response = await self.enrich("isochrone", options)
+        if raw_response:
+            return response
+        return await self._to_gdf(isochrone_to_gdf, response)
+
+    async def points_of_interest(self, options: Dict, body: Dict = {}) -> Dict:
+        """Call `/points_of_interest` endpoint. See `IggyAPI.points_of_interest`.
+
+        :param options: dict
+        :param body: dict
+            GeoJSON object, to be used with POST
+        :return: dict
+        """
+        return await self.enrich("points_of_interest", options, body)
+
+    async def amenities_score(self, options: Dict) -> Dict:
+        """Call `/amenities_score` endpoint. See `IggyAPI.amenities_score`.
+
+        :param options: dict
+        :return: dict
+        """
+        return await self.enrich("amenities_score", options)
+
+    async def clusters(self, options: Dict, raw_response: bool = False) \
+            -> Union["gpd.GeoDataFrame", Dict]:
+        """Call `/clusters` endpoint. See `IggyAPI.clusters`.
+
+        :param options: dict
+        :param raw_response: bool
+
+        :return: gpd.GeoDataFrame or dict
+        """
+        response = await self.enrich("clusters", options)
+        if raw_response:
+            return response
+        return await self._to_gdf(clusters_to_gdf, response)
+
+    async def points_of_interest_options(self) -> Dict:
+        """Call `/points_of_interest_options` endpoint.
+
+        :return: dict
+        """
+        return await self.enrich("points_of_interest_options",
+                                 {"method": "GET", "params": None})
@@ -0,0 +1,171 @@
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+from typing import Dict, Optional
+
+
+class ResponseCache():
+    """Persistent on-disk cache of Iggy API responses, backed by SQLite
+
+    Entries are keyed on endpoint, HTTP method, normalized query
+    parameters and POST body, so identical requests are served from disk
+    across process restarts. Once the cache grows past `max_bytes`, the
+    least recently used entries are evicted.
+
+    Parameters
+    ----------
+    path : str
+        Location of the SQLite database file. Use ":memory:" for a
+        cache that lives only as long as this object.
+    ttl : float, optional
+        Default time-to-live of an entry in seconds. None (default)
+        means entries never expire.
+    endpoint_ttls : dict, optional
+        Per-endpoint overrides of `ttl`, e.g. `{"lookup": 86400}`.
+        A TTL of 0 disables caching for that endpoint.
+    max_bytes : int, optional
+        Size cap on the total size of stored responses. None (default)
+        means the cache is unbounded.
+
+    A pickled cache reopens the database at `path` when unpickled, so a
+    file-backed cache is shared by all processes it is sent to (e.g. by
+    `IggyFeatureSet.enrich_dataframe(processes=...)`). An in-memory cache
+    is unpickled as a new, empty cache.
+    """
+    def __init__(self, path: str, ttl: float = None, endpoint_ttls: Dict = None,
+                 max_bytes: int = None):
+        self.path = path
+        self.ttl = ttl
+        self.endpoint_ttls = endpoint_ttls or {}
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._conn = self._connect()
+
+    def __getstate__(self):
+        return {"path": self.path, "ttl": self.ttl,
+                "endpoint_ttls": self.endpoint_ttls, "max_bytes": self.max_bytes}
+
+    def __setstate__(self, state):
+        self.__init__(**state)
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.path, timeout=30, check_same_thread=False,
+                               isolation_level=None)
+        if self.path != ":memory:":
+            conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("BEGIN IMMEDIATE")
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS responses ("
+            " key TEXT PRIMARY KEY,"
+            " endpoint TEXT NOT NULL,"
+            " value TEXT NOT NULL,"
+            " size INTEGER NOT NULL,"
+            " created REAL NOT NULL,"
+            " accessed REAL NOT NULL)")
+        conn.execute(
+            "CREATE INDEX IF NOT EXISTS responses_accessed ON responses (accessed)")
+        # Running total of `size`, kept up to date by triggers in the same
+        # transaction as every write, so that `set` need not scan the table
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS cache_size ("
+            " id INTEGER PRIMARY KEY CHECK (id = 0),"
+            " total INTEGER NOT NULL)")
+        conn.execute(
+            "INSERT OR IGNORE INTO cache_size (id, total) "
+            "SELECT 0, COALESCE(SUM(size), 0) FROM responses")
+        conn.execute(
+            "CREATE TRIGGER IF NOT EXISTS responses_insert AFTER INSERT ON responses "
+            "BEGIN UPDATE cache_size SET total = total + NEW.size; END")
+        conn.execute(
+            "CREATE TRIGGER IF NOT EXISTS responses_update AFTER UPDATE OF size ON responses "
+            "BEGIN UPDATE cache_size SET total = total + NEW.size - OLD.size; END")
+        conn.execute(
+            "CREATE TRIGGER IF NOT EXISTS responses_delete AFTER DELETE ON responses "
+            "BEGIN UPDATE cache_size SET total = total - OLD.size; END")
+        conn.execute("COMMIT")
+        return conn
+
+    @staticmethod
+    def make_key(endpoint: str, method: str, params: Dict = None,
+                 body: Dict = None) -> str:
+        """Build the cache key of a request.
+
+        Query parameter values are compared as they are sent on the wire,
+        so `{"latitude": 44.9}` and `{"latitude": "44.9"}` share a key.
+        """
+        params = {k: str(v) for k, v in (params or {}).items() if v is not None}
+        raw = json.dumps([endpoint, method.upper(), params, body or {}],
+                         sort_keys=True, separators=(",", ":"))
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    def _ttl(self, endpoint: str) -> Optional[float]:
+        return self.endpoint_ttls.get(endpoint, self.ttl)
+
+    def enabled_for(self, endpoint: str) -> bool:
+        return self._ttl(endpoint) != 0
+
+    def get(self, endpoint: str, key: str) -> Optional[Dict]:
+        """Return cached response for `key`, or None if missing or expired"""
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT value, created FROM responses WHERE key = ?",
+                (key,)).fetchone()
+            if row is None:
+                return None
+            value, created = row
+            ttl = self._ttl(endpoint)
+            if ttl is not None and now - created > ttl:
+                self._conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+                return None
+            self._conn.execute("UPDATE responses SET accessed = ? WHERE key = ?",
+                               (now, key))
+        return json.loads(value)
+
+    def set(self, endpoint: str, key: str, response: Dict):
+        """Store `response` under `key`, evicting LRU entries if needed"""
+        value = json.dumps(response, separators=(",", ":"))
+        now = time.time()
+        with self._lock:
+            # an upsert rather than INSERT OR REPLACE, whose implicit
+            # delete would not fire the size trigger
+            self._conn.execute(
+                "INSERT INTO responses "
+                "(key, endpoint, value, size, created, accessed) "
+                "VALUES (?, ?, ?, ?, ?, ?) "
+                "ON CONFLICT (key) DO UPDATE SET endpoint = excluded.endpoint, "
+                "value = excluded.value, size = excluded.size, "
+                "created = excluded.created, accessed = excluded.accessed",
+                (key, endpoint, value, len(value), now, now))
+            if self.max_bytes is not None:
+                self._evict()
+
+    def _evict(self):
+        total = self._conn.execute("SELECT total FROM cache_size").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        excess = total - self.max_bytes
+        freed = 0
+        stale = []
+        for key, size in self._conn.execute(
+                "SELECT key, size FROM responses ORDER BY accessed ASC"):
+            stale.append((key,))
+            freed += size
+            if freed >= excess:
+                break
+        self._conn.executemany("DELETE FROM responses WHERE key = ?", stale)
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+
+    def clear(self):
+        """Remove all entries"""
+        with self._lock:
+            self._conn.execute("DELETE FROM responses")
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
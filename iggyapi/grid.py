@@ -0,0 +1,52 @@
+import numpy as np
+from typing import Dict, Tuple
+
+EARTH_RADIUS_M = 6371008.8
+
+
+def geohash_cell_size(precision: int) -> Tuple[float, float]:
+    """Width and height in degrees of a geohash cell at `precision`
+
+    Precision 5 is roughly 4.9 x 4.9 km, 6 is 1.2 x 0.6 km, 7 is
+    150 x 150 m and 8 is 38 x 19 m (at the equator).
+    """
+    lng_bits = (5 * precision + 1) // 2
+    lat_bits = (5 * precision) // 2
+    return 360.0 / 2 ** lng_bits, 180.0 / 2 ** lat_bits
+
+
+def snap_to_geohash(longitudes: np.ndarray, latitudes: np.ndarray,
+                    precision: int) -> Tuple[np.ndarray, np.ndarray]:
+    """Snap points to the centers of their geohash cells at `precision`"""
+    width, height = geohash_cell_size(precision)
+    lng_cells = np.floor((np.asarray(longitudes, dtype=np.float64) + 180.0) / width)
+    lat_cells = np.floor((np.asarray(latitudes, dtype=np.float64) + 90.0) / height)
+    return (lng_cells + 0.5) * width - 180.0, (lat_cells + 0.5) * height - 90.0
+
+
+def haversine_m(lng1: np.ndarray, lat1: np.ndarray,
+                lng2: np.ndarray, lat2: np.ndarray) -> np.ndarray:
+    """Great-circle distance in meters between arrays of points"""
+    lng1, lat1, lng2, lat2 = map(np.radians, (lng1, lat1, lng2, lat2))
+    a = (np.sin((lat2 - lat1) / 2) ** 2
+         + np.cos(lat1) * np.cos(lat2) * np.sin((lng2 - lng1) / 2) ** 2)
+    return 2 * EARTH_RADIUS_M * np.arcsin(np.sqrt(a))
+
+
+def snap_error_stats(longitudes: np.ndarray, latitudes: np.ndarray,
+                     snapped_longitudes: np.ndarray, snapped_latitudes: np.ndarray,
+                     n_cells: int) -> Dict:
+    """Summary of the displacement, in meters, caused by snapping"""
+    errors = haversine_m(longitudes, latitudes, snapped_longitudes, snapped_latitudes)
+    errors = errors[~np.isnan(errors)]
+    if errors.size == 0:
+        return {"points": 0, "cells": n_cells, "mean_m": None, "median_m": None,
+                "p95_m": None, "max_m": None}
+    return {
+        "points": int(errors.size),
+        "cells": n_cells,
+        "mean_m": float(errors.mean()),
+        "median_m": float(np.median(errors)),
+        "p95_m": float(np.percentile(errors, 95)),
+        "max_m": float(errors.max()),
+    }
@@ -1,61 +1,351 @@
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, ThreadPoolExecutor, wait
 from copy import deepcopy
-import geopandas as gpd
+import hashlib
+import json
 import logging
+import numpy as np
 import pandas as pd
-from shapely.geometry import Point
-from typing import List
+import requests
+import sys
+import time
+import uuid
+from typing import Iterable, Iterator, List, Tuple
 
 from iggyapi.api import IggyAPI
+from iggyapi.grid import snap_error_stats, snap_to_geohash
+from iggyapi.poiindex import \
+    DEFAULT_TILE_DEGREES, POIIndex, covers, fetch_tile, tile_calls, tiles_covering
+from iggyapi.ratelimit import RetryPolicy
+from iggyapi.stream import Checkpoint, ChunkWriter, read_chunks
 
 logger = logging.getLogger(__name__)
 logger.setLevel(logging.INFO)
 
+# Key of the feature fingerprints recorded in `DataFrame.attrs`
+FINGERPRINTS_ATTR = "iggy_fingerprints"
+FAILURE_COLUMNS = ["row", "feature", "status", "message", "attempts"]
+# Error response of rows with a NaN coordinate, for which no request is made
+MISSING_COORDINATES = {"message": "Missing coordinates"}
+
+
+def _calc_value(contents, key, n):
+    return contents[key]
+
+
+def _calc_count(contents, key, n):
+    return len([d[key] for d in contents])
+
+
+def _calc_min(contents, key, n):
+    try:
+        return min([d[key] for d in contents])
+    except ValueError:
+        return None
+
+
+def _calc_max(contents, key, n):
+    try:
+        return max([d[key] for d in contents])
+    except ValueError:
+        return None
+
+
+def _calc_sum(contents, key, n):
+    return sum([d[key] for d in contents])
+
+
+def _calc_mean(contents, key, n):
+    values = [d[key] for d in contents]
+    return sum(values) / len(values) if values else None
+
+
+def _calc_nth(contents, key, n):
+    values = sorted([d[key] for d in contents])
+    return values[n - 1] if len(values) >= n else None
+
+
+_CALC_METHODS = {
+    'value': _calc_value,
+    'count': _calc_count,
+    'min': _calc_min,
+    'max': _calc_max,
+    'sum': _calc_sum,
+    'mean': _calc_mean,
+    'nth': _calc_nth,
+}
+
+
+def _typed_array(values: List) -> Tuple[np.ndarray, np.ndarray]:
+    """Convert scalars (None for missing) to a typed array and null mask"""
+    mask = np.fromiter((v is None for v in values), dtype=bool, count=len(values))
+    present = [v for v in values if v is not None]
+    if all(isinstance(v, (int, np.integer)) and not isinstance(v, bool) for v in present):
+        return np.array([0 if v is None else v for v in values], dtype=np.int64), mask
+    if all(isinstance(v, (float, int, np.number)) for v in present):
+        return np.array([np.nan if v is None else v for v in values], dtype=np.float64), mask
+    # filled element by element: np.array would turn equal-length list
+    # values into a 2-D array
+    objects = np.empty(len(values), dtype=object)
+    for i, v in enumerate(values):
+        objects[i] = v
+    return objects, mask
+
+
+def _is_geodataframe(df) -> bool:
+    # A GeoDataFrame can only exist once geopandas has been imported, so
+    # there is no need to import it just to check
+    gpd = sys.modules.get("geopandas")
+    return gpd is not None and isinstance(df, gpd.GeoDataFrame)
+
+
+def _is_partitioned(df) -> bool:
+    # dask and dask-geopandas frames, or any frame API built the same way
+    return hasattr(df, "map_partitions") and hasattr(df, "_meta")
+
+
+def _check_passthrough(method: str, kwargs: dict):
+    """Reject `enrich_dataframe` options that `method` cannot pass through"""
+    unsupported = sorted(set(kwargs) & {"inplace", "meta"})
+    if unsupported:
+        logger.error(f'`{method}` does not support {", ".join(unsupported)}; '
+                     f'it always returns a new in-memory data frame')
+        raise ValueError
+
+
+def _fetch_safely(fetch, *args, deadline: float = None) -> dict:
+    """Call `fetch`, returning connection errors (and missed deadlines) as
+    error responses"""
+    try:
+        return fetch(*args, deadline=deadline)
+    except requests.RequestException as e:
+        logger.error(f"Request failed: {e}")
+        return {"message": f"{type(e).__name__}: {e}", "status_code": None,
+                "exception": type(e).__name__}
+
+
+def _is_retryable(response: dict, retry: RetryPolicy) -> bool:
+    return "message" in response and (
+        "exception" in response or response.get("status_code") in retry.retry_statuses)
+
+
+def _failure_records(features: List, responses: List[dict], attempts: np.ndarray,
+                     positions: np.ndarray, index) -> List[tuple]:
+    """(row, feature, status, message, attempts) of every row whose
+    response, at `positions[row]` (or `row`) in `responses`, is an error"""
+    failed = [i for i, r in enumerate(responses) if "message" in r]
+    if not failed:
+        return []
+    rows = np.flatnonzero(np.isin(positions, failed)) if positions is not None \
+        else np.array(failed)
+    records = []
+    for row in rows.tolist():
+        i = row if positions is None else positions[row]
+        response = responses[i]
+        for feature in features:
+            records.append((index[row], feature.name, response.get("status_code"),
+                            response["message"], int(attempts[i])))
+    return records
+
+
+def _failure_table(records: List[tuple]):
+    table = pd.DataFrame(records, columns=FAILURE_COLUMNS)
+    return table.astype({"status": "Int64", "attempts": "int64"})
+
+
+def _concat_failures(tables: List):
+    tables = [t for t in tables if t is not None and len(t)]
+    return pd.concat(tables, ignore_index=True) if tables else _failure_table([])
+
+
+def _has_polygons(df) -> bool:
+    """Whether a GeoDataFrame holds polygons, which must not be mixed
+    with other geometry types"""
+    geom_types = df.geometry.geom_type
+    polygons = geom_types.isin(['Polygon', 'MultiPolygon']).to_numpy()
+    if polygons.any() and not (polygons | df.geometry.isna().to_numpy()).all():
+        logger.error('Cannot enrich a mix of polygons and other geometries')
+        raise ValueError
+    return bool(polygons.any())
+
+
+def _is_local_poi_feature(feature) -> bool:
+    # Only straight-line radii can be answered from POI coordinates;
+    # travel-time radii depend on the road network
+    return isinstance(feature, IggyPOIFeature) and 'within_miles' in feature.params
+
+
+def _same_values(a: np.ndarray, b: np.ndarray) -> np.ndarray:
+    """Element-wise equality treating NaNs as equal"""
+    return (a == b) | (np.isnan(a) & np.isnan(b))
+
+
+def _unique_points(longitudes: np.ndarray, latitudes: np.ndarray) \
+        -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Unique points in order of first appearance, and for every input
+    point the position of its unique point"""
+    positions = {}
+    inverse = np.fromiter((positions.setdefault(c, len(positions))
+                           for c in zip(longitudes.tolist(), latitudes.tolist())),
+                          dtype=np.int64, count=len(longitudes))
+    unique = np.array(list(positions), dtype=np.float64).reshape(-1, 2)
+    return unique[:, 0], unique[:, 1], inverse
+
+
+def _with_missing(positions: np.ndarray, valid: np.ndarray, n: int,
+                  n_points: int) -> np.ndarray:
+    """Positions of all `n` rows in the `n_points` responses of the `valid`
+    rows (at `positions`, or in order) followed by a missing-coordinates
+    response"""
+    full = np.full(n, n_points, dtype=np.int64)
+    full[valid] = np.arange(len(valid)) if positions is None else positions
+    return full
+
+
+def _enrich_partition(feature_set, df, longitude_col: str, latitude_col: str,
+                      kwargs: dict):
+    """Enrich one partition of a data frame in a worker process
+
+    The worker's clients may have run other partitions before, so only
+    the metrics recorded for this one are returned.
+    """
+    apis = feature_set._apis()
+    before = [deepcopy(api.metrics) for api in apis]
+    enriched = feature_set.enrich_dataframe(df, longitude_col=longitude_col,
+                                            latitude_col=latitude_col, **kwargs)
+    metrics = [api.metrics.since(earlier) for api, earlier in zip(apis, before)]
+    return enriched, feature_set.snap_stats, metrics, feature_set.failures
+
+
+def _enrich_partition_frame(df, feature_set, longitude_col: str, latitude_col: str,
+                            dtypes: dict, kwargs: dict):
+    """Enrich one partition of a partitioned data frame"""
+    if len(df) == 0:
+        return _with_empty_columns(df, dtypes)
+    enriched = feature_set.enrich_dataframe(df, longitude_col=longitude_col,
+                                            latitude_col=latitude_col, **kwargs)
+    return enriched.astype(dtypes)
+
+
+def _with_empty_columns(df, dtypes: dict):
+    """Copy of an empty frame with empty columns of the given dtypes"""
+    df = df.copy()
+    for name, dtype in dtypes.items():
+        df[name] = pd.Series(dtype=dtype, index=df.index)
+    return df
+
+
+def _merge_snap_stats(stats: List[dict]) -> dict:
+    """Combine the snapping statistics of several partitions. Medians and
+    percentiles cannot be combined exactly and are left out."""
+    stats = [s for s in stats if s["points"]]
+    points = sum(s["points"] for s in stats)
+    return {
+        "points": points,
+        "cells": sum(s["cells"] for s in stats),
+        "mean_m": sum(s["mean_m"] * s["points"] for s in stats) / points if points else None,
+        "median_m": None,
+        "p95_m": None,
+        "max_m": max(s["max_m"] for s in stats) if points else None,
+    }
+
 
 class FeatureCalc():
     """Calculates feature value from Iggy API response dict
 
+    The key path and calculation are resolved once, when `result_keys`
+    or `calc_method` are set, and the response is read without copying.
+
     Parameters
     ----------
-    calc_method: str, one of `count`, `min`, `max`, `value` (default)
-        How to derive feature value from input
+    calc_method: str, one of `count`, `min`, `max`, `sum`, `mean`, `nth`, `value` (default)
+        How to derive feature value from input. `nth` is the n-th smallest
+        value, e.g. the distance to the n-th nearest POI.
     result_keys : list of str
         keys for retrieving feature from API result dict, in order
         of traversal
+    n : int
+        Rank used by `nth` (1 is the minimum)
     """
-    def __init__(self, result_keys: List, calc_method: str = 'value'):
+    def __init__(self, result_keys: List, calc_method: str = 'value', n: int = 1):
         self.calc_method = calc_method
         self.result_keys = result_keys
+        self.n = n
+
+    @property
+    def calc_method(self) -> str:
+        return self._calc_method
+
+    @calc_method.setter
+    def calc_method(self, calc_method: str):
+        self._calc_method = calc_method
+        self._calc = _CALC_METHODS.get(calc_method)
+
+    @property
+    def result_keys(self) -> List:
+        return self._result_keys
+
+    @result_keys.setter
+    def result_keys(self, result_keys: List):
+        self._result_keys = result_keys
+        self._path = tuple(result_keys[:-1])
+        self._final_key = result_keys[-1]
 
     def __call__(self, input_data: dict) -> float:
-        contents = self._dict_find(input_data, self.result_keys[:-1])
-        final_key = self.result_keys[-1]
+        self._check_method()
+        return self._calc(self._dict_find(input_data, self._path), self._final_key, self.n)
+
+    def batch(self, responses: List[dict]) -> Tuple[np.ndarray, np.ndarray]:
+        """Calculate feature values for many API responses at once.
+
+        Error responses (containing `message`) and None are treated as
+        missing. Returns a typed array of values and a boolean mask that
+        is True where the value is null; `count` gives int64 values,
+        `min`, `max`, `sum`, `mean` and `nth` give float64.
+        """
+        self._check_method()
+        n_rows = len(responses)
+        contents = [None if r is None or "message" in r else self._dict_find(r, self._path)
+                    for r in responses]
+        key = self._final_key
         if self.calc_method == 'value':
-            result = contents[final_key]
-        elif self.calc_method == 'count':
-            try:
-                result = len([d[final_key] for d in contents])
-            except ValueError:
-                result = None
-        elif self.calc_method == 'min':
-            try:
-                result = min([d[final_key] for d in contents])
-            except ValueError:
-                result = None
-        elif self.calc_method == 'max':
-            try:
-                result = max([d[final_key] for d in contents])
-            except ValueError:
-                result = None
-        else:
+            return _typed_array([None if c is None else c[key] for c in contents])
+
+        missing = np.fromiter((c is None for c in contents), dtype=bool, count=n_rows)
+        lengths = np.fromiter((0 if c is None else len(c) for c in contents),
+                              dtype=np.int64, count=n_rows)
+        if self.calc_method == 'count':
+            return lengths, missing
+        flat = np.fromiter((d[key] for c in contents if c is not None for d in c),
+                           dtype=np.float64, count=int(lengths.sum()))
+
+        values = np.full(n_rows, np.nan)
+        starts = np.cumsum(lengths) - lengths
+        if self.calc_method == 'nth':
+            filled = lengths >= self.n
+            order = np.lexsort((flat, np.repeat(np.arange(n_rows), lengths)))
+            values[filled] = flat[order][starts[filled] + self.n - 1]
+            return values, ~filled
+
+        filled = lengths > 0
+        if filled.any():
+            ufunc = {'min': np.minimum, 'max': np.maximum}.get(self.calc_method, np.add)
+            values[filled] = ufunc.reduceat(flat, starts[filled])
+        if self.calc_method == 'mean':
+            values[filled] /= lengths[filled]
+        if self.calc_method == 'sum':
+            values[~missing & ~filled] = 0
+            return values, missing
+        return values, ~filled
+
+    def _check_method(self):
+        if self._calc is None:
             logger.error(f'Unsupported `calc_method`: {self.calc_method}')
             raise ValueError
-        return result
 
     def _dict_find(self, d: dict, path_keys: List):
-        dc = deepcopy(d)
         for p in path_keys:
-            dc = dc[p]
-        return dc
+            d = d[p]
+        return d
 
 
 class IggyFeature():
@@ -74,14 +364,27 @@ class IggyFeature():
         (excluding latitude and longitude)
     calc : FeatureCalc
         Calculation method
+    snap_precision : int, optional
+        Opt-in approximation for smooth features: points are snapped to
+        the center of their geohash cell at this precision (e.g. 7, about
+        150 m) and the API is called once per occupied cell, with the
+        result shared by every point in the cell.
+
+    Subclasses may list in `merge_params` the comma-separated parameters
+    (e.g. `labels`) whose values can be combined with those of other
+    features in a single request by `IggyFeatureSet`.
     """
+    merge_params = ()
+
     def __init__(self, api: IggyAPI, name: str = None, endpoint: str = None,
-                 params: dict = None, calc: FeatureCalc = None):
+                 params: dict = None, calc: FeatureCalc = None,
+                 snap_precision: int = None):
         self.api = api
         self.name = name
         self.endpoint = endpoint
         self.params = params
         self.calc = calc
+        self.snap_precision = snap_precision
 
     def from_dict(self, d: dict):
         self.name = d['name']
@@ -96,6 +399,10 @@ class IggyFeature():
         querystring["longitude"] = longitude
         options = {"params": querystring}
         api_response = self.api.enrich(self.endpoint, options)
+        return self.evaluate(api_response)
+
+    def evaluate(self, api_response: dict) -> float:
+        """Derive feature value from an API response for this feature"""
         if "message" in api_response:
             logger.error(f"Error API response: {api_response['message']}")
             result = None
@@ -103,10 +410,43 @@ class IggyFeature():
             result = self.calc(api_response)
         return result
 
+    @property
+    def fingerprint(self) -> str:
+        """Hash of the definition that determines this feature's values:
+        endpoint, params, result keys, calc method and snapping"""
+        definition = [self.endpoint, self.params, self.calc.result_keys,
+                      self.calc.calc_method, self.calc.n, self.snap_precision]
+        raw = json.dumps(definition, sort_keys=True, default=str)
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()[:16]
+
+    @property
+    def dtype(self) -> str:
+        """dtype of this feature's column in partitioned (e.g. dask) output;
+        raw values may be of any type, aggregates are always numeric"""
+        return 'object' if self.calc.calc_method == 'value' else 'float64'
+
+    def evaluate_batch(self, api_responses: List[dict]) -> np.ndarray:
+        """Derive feature values from many API responses as a column.
+
+        Missing values are NaN, or None for non-numeric features.
+        """
+        for api_response in api_responses:
+            if "message" in api_response:
+                logger.error(f"Error API response: {api_response['message']}")
+        values, mask = self.calc.batch(api_responses)
+        if mask.any():
+            if values.dtype.kind in 'iub':
+                values = values.astype(np.float64)
+            values[mask] = np.nan if values.dtype.kind == 'f' else None
+        return values
+
 
 class IggyLookupFeature(IggyFeature):
-    def __init__(self, api: IggyAPI, calc_method: str, label: str):
-        super().__init__(api)
+    merge_params = ('labels',)
+
+    def __init__(self, api: IggyAPI, calc_method: str, label: str,
+                 snap_precision: int = None):
+        super().__init__(api, snap_precision=snap_precision)
         if len(label.split(',')) > 1:
             logging.error('IggyLookupFeature supports only a single label')
             raise ValueError
@@ -123,10 +463,13 @@ class IggyLookupFeature(IggyFeature):
 
 
 class IggyPOIFeature(IggyFeature):
+    merge_params = ('labels', 'brands')
+
     def __init__(self, api: IggyAPI, calc_method: str, label: str = None, brand: str = None,
                  within_minutes_driving: float = None, within_minutes_biking: float = None,
-                 within_minutes_walking: float = None, within_miles: float = None):
-        super().__init__(api)
+                 within_minutes_walking: float = None, within_miles: float = None,
+                 n: int = 1, snap_precision: int = None):
+        super().__init__(api, snap_precision=snap_precision)
         if label and len(label.split(',')) > 1:
             logging.error('IggyPOIFeature supports only a single brand or label')
             raise ValueError
@@ -140,21 +483,22 @@ class IggyPOIFeature(IggyFeature):
                                     within_minutes_walking, within_miles]]) != 3:
             logging.error('Must specify exactly one of `within_miles|minutes_driving|walking|biking')
             raise ValueError
+        method_name = f'{calc_method}{n}' if calc_method == 'nth' else calc_method
         if label:
-            self.name = f'poi_{label}_{calc_method}'
+            self.name = f'poi_{label}_{method_name}'
             self.params = {
                 'labels': label
             }
             result_key = label
         else:
-            self.name = f'poi_{brand}_{calc_method}'
+            self.name = f'poi_{brand}_{method_name}'
             self.params = {
                 'brands': brand
             }
             result_key = brand
         self.endpoint = 'points_of_interest'
         self.calc = FeatureCalc(result_keys=[result_key, 'straight_line_distance_miles'],
-                                calc_method=calc_method)
+                                calc_method=calc_method, n=n)
         if within_minutes_driving:
             self.params['within_minutes_driving'] = within_minutes_driving
         elif within_minutes_biking:
@@ -168,8 +512,9 @@ class IggyPOIFeature(IggyFeature):
 class IggyAmenitiesScoreFeature(IggyFeature):
     def __init__(self, api: IggyAPI, within_minutes_driving: float = None,
                  within_minutes_biking: float = None,
-                 within_minutes_walking: float = None, within_miles: float = None):
-        super().__init__(api)
+                 within_minutes_walking: float = None, within_miles: float = None,
+                 snap_precision: int = None):
+        super().__init__(api, snap_precision=snap_precision)
         if sum([x is None for x in [within_minutes_driving, within_minutes_biking,
                                     within_minutes_walking, within_miles]]) != 3:
             logging.error('Must specify exactly one of `within_miles|minutes_driving|walking|biking')
@@ -195,12 +540,76 @@ class IggyAmenitiesScoreFeature(IggyFeature):
                                 calc_method='value')
 
 
+class IggyRequest():
+    """A single API request shared by one or more IggyFeatures
+
+    Built by `IggyFeatureSet.plan`. The response to each request is
+    fanned out to every feature's `FeatureCalc`.
+
+    Parameters
+    ----------
+    api : IggyAPI
+        The IggyAPI object used to make the request
+    endpoint : str
+        Iggy API endpoint
+    params : dict
+        Merged query parameters (excluding latitude and longitude)
+    features : list of IggyFeature
+        Features whose values are derived from the response
+    snap_precision : int, optional
+        Geohash precision points are snapped to before the request
+    """
+    def __init__(self, api: IggyAPI, endpoint: str, params: dict, features: List,
+                 snap_precision: int = None):
+        self.api = api
+        self.endpoint = endpoint
+        self.params = params
+        self.features = features
+        self.snap_precision = snap_precision
+
+    def calculate(self, longitude: float, latitude: float) -> List:
+        """Calculate values of all features at input point, in order"""
+        api_response = self.fetch(longitude, latitude)
+        return [feature.evaluate(api_response) for feature in self.features]
+
+    def fetch(self, longitude: float, latitude: float, deadline: float = None) -> dict:
+        """Get API response for input point, by `deadline` if given (see
+        `IggyAPI.enrich`)"""
+        querystring = deepcopy(self.params)
+        querystring["latitude"] = latitude
+        querystring["longitude"] = longitude
+        return self.api.enrich(self.endpoint, {"params": querystring}, deadline=deadline)
+
+    def fetch_polygon(self, geometry: dict, deadline: float = None) -> dict:
+        """Get API response for the POIs within a GeoJSON geometry, using
+        the POST variant of the endpoint"""
+        options = {"method": "POST", "params": deepcopy(self.params)}
+        body = {"type": "Feature", "properties": {}, "geometry": geometry}
+        return self.api.enrich(self.endpoint, options, body, deadline=deadline)
+
+
 class IggyFeatureSet():
-    """A collection of IggyFeatures"""
+    """A collection of IggyFeatures
+
+    After `enrich_dataframe`, `snap_stats` maps the name of every feature
+    using `snap_precision` to statistics of the distance, in meters,
+    between the input points and the cell centers they were snapped to
+    (without the median and 95th percentile when run with `processes`).
+    `failures` is the table of (row, feature) values that could not be
+    computed by the last enrichment, see `enrich_dataframe`.
+    """
     def __init__(self, features: List):
         self.features = features
+        self.snap_stats = {}
+        self.failures = None
 
-    def enrich_dataframe(self, df, longitude_col: str = None, latitude_col: str = None):
+    def enrich_dataframe(self, df, longitude_col: str = None, latitude_col: str = None,
+                         max_workers: int = 1, dedupe: bool = True,
+                         precision: int = None, processes: int = None,
+                         meta: dict = None, inplace: bool = False,
+                         local_pois: bool = False,
+                         tile_degrees: float = DEFAULT_TILE_DEGREES,
+                         retry_failed: RetryPolicy = None, call_timeout: float = None):
         """Enrich rows in data frame with this feature set.
 
         The data frame passed as input can be either a pandas DataFrame
@@ -209,6 +618,20 @@ class IggyFeatureSet():
         If the input is a pandas DataFrame, then latitude_col and
         longitude_col must be specified.
 
+        A GeoDataFrame of polygons (e.g. parcels or trade areas) is
+        enriched with the POST variant of `/points_of_interest`: each
+        `IggyPOIFeature`, which must use `count`, gives the number of POIs
+        within each polygon, and its radius is ignored. Rows with a
+        missing geometry get NaN.
+
+        Partitioned data frames exposing `map_partitions`, such as dask
+        (-geopandas) DataFrames, are enriched lazily: a partitioned frame
+        is returned and every partition is enriched when it is computed.
+        API clients are unpickled once per worker process, so all the
+        partitions a worker computes share its connection pools. Request
+        metrics recorded by remote workers stay there, and `failures` and
+        `snap_stats` are not populated for partitioned input.
+
         Parameters
         ----------
         df : pd.DataFrame or gpd.GeoDataFrame
@@ -217,17 +640,637 @@ class IggyFeatureSet():
             name of latitude column for pandas DataFrame input
         longitude_col : str
             name of longitude column for pandas DataFrame input
+        max_workers : int
+            Number of threads used to issue (row, feature) API calls
+            concurrently. Results are returned in row order regardless.
+            The default of 1 runs all calls sequentially.
+        dedupe : bool
+            If True (default), the API is called once per unique point and
+            the result is copied to every row sharing that point.
+        precision : int, optional
+            Number of decimal places coordinates are rounded to before
+            deduplication, e.g. 5 (~1 m). Points are sent to the API at the
+            rounded coordinates. By default coordinates are used as-is.
+        processes : int, optional
+            Number of worker processes the rows are partitioned across,
+            so that response post-processing runs on several cores. Each
+            worker enriches its partition with its own copy of the API
+            clients, using `max_workers` threads. Give the clients a
+            file-backed `ResponseCache` so that workers share responses;
+            their metrics are merged back into the clients on completion.
+        meta : dict, optional
+            For partitioned input, dtypes of feature columns overriding
+            `IggyFeature.dtype`, e.g. `{"lookup_median_age_value": "float64"}`
+        inplace : bool
+            If True, feature columns are added to `df` itself and None is
+            returned, instead of enriching a copy of the whole frame. Not
+            supported for partitioned input.
+        local_pois : bool
+            If True, `IggyPOIFeature`s with a `within_miles` radius are
+            computed locally: the POIs of the area around the points are
+            fetched once, one POST `/points_of_interest` call per tile of
+            `tile_degrees` degrees, and indexed in memory. API usage then
+            scales with the area covered rather than with the number of
+            rows. Features with travel-time radii still use the API.
+        tile_degrees : float
+            Size of the tiles fetched with `local_pois`
+        retry_failed : RetryPolicy, optional
+            Policy of the deferred retry queue. Requests that still fail
+            once the client's own retries are exhausted, with a status in
+            `retry_statuses` or a connection error, are queued and
+            re-sent after all other requests, for up to `max_retries`
+            rounds with the policy's backoff. By default failed requests
+            are not retried.
+        call_timeout : float, optional
+            Seconds each API call, including the client's retries, may
+            take. Timeouts are shortened to fit and calls that run out
+            of time are recorded as failures (a `Timeout` exception), so
+            one slow point cannot hold up the whole frame. The budget is
+            per call, not per row: a row served by several requests may
+            take up to that many times as long. Each deferred retry
+            round gets a new budget.
+
+        Every (row, feature) that could not be computed is recorded in
+        `failures`, a DataFrame with columns `row` (index label),
+        `feature`, `status` (HTTP status, if any), `message` and
+        `attempts` (requests made by the feature set); use
+        `retry_failures` to re-run only those. Rows with a NaN coordinate
+        are not sent to the API and fail with "Missing coordinates".
 
         Returns
         -------
         enriched_df : pd.DataFrame or gpd.GeoDataFrame (same type as input)
+            or None if `inplace`
         """
+        options = dict(max_workers=max_workers, dedupe=dedupe, precision=precision,
+                       local_pois=local_pois, tile_degrees=tile_degrees,
+                       retry_failed=retry_failed, call_timeout=call_timeout)
+        if _is_partitioned(df):
+            if inplace:
+                logger.error('`inplace` is not supported for partitioned data frames')
+                raise ValueError
+            return self._enrich_partitioned(df, longitude_col, latitude_col, meta, **options)
+        if processes is not None and processes > 1 and len(df) > 1:
+            enriched_df = self._enrich_processes(df, longitude_col, latitude_col,
+                                                 processes, **options)
+            if not inplace:
+                return enriched_df
+            for feature in self.features:
+                df[feature.name] = enriched_df[feature.name].to_numpy()
+            df.attrs[FINGERPRINTS_ATTR] = self.fingerprints()
+            return None
+        enriched_df = df if inplace else df.copy()
+        if _is_geodataframe(df) and _has_polygons(df):
+            columns = self._enrich_polygons(df, max_workers, dedupe, retry_failed,
+                                            call_timeout)
+            for feature in self.features:
+                enriched_df[feature.name] = pd.Series(columns.pop(feature.name),
+                                                      index=enriched_df.index, copy=False)
+            enriched_df.attrs[FINGERPRINTS_ATTR] = self.fingerprints()
+            return None if inplace else enriched_df
+        longitudes, latitudes = self._coordinates(df, longitude_col, latitude_col)
+        if precision is not None:
+            longitudes = np.round(longitudes, precision)
+            latitudes = np.round(latitudes, precision)
+        local = [f for f in self.features if local_pois and _is_local_poi_feature(f)]
+        plan = self._plan([f for f in self.features if f not in local])
+        self.snap_stats = {}
+        # rows with a NaN coordinate are not sent, and fail without a request
+        invalid = np.isnan(longitudes) | np.isnan(latitudes)
+        valid = np.flatnonzero(~invalid) if invalid.any() else None
+        valid_lngs, valid_lats = (longitudes, latitudes) if valid is None \
+            else (longitudes[valid], latitudes[valid])
+        calls, inverses = [], []
+        for request in plan:
+            lngs, lats, inverse = valid_lngs, valid_lats, None
+            if request.snap_precision is not None:
+                lngs, lats = snap_to_geohash(valid_lngs, valid_lats, request.snap_precision)
+            if dedupe or request.snap_precision is not None:
+                lngs, lats, inverse = _unique_points(lngs, lats)
+            if request.snap_precision is not None:
+                stats = snap_error_stats(valid_lngs, valid_lats, lngs[inverse],
+                                         lats[inverse], len(lngs))
+                logger.info(f"Snapped {stats['points']} points to {stats['cells']} cells "
+                            f"for /{request.endpoint}, mean error {stats['mean_m']} m")
+                for feature in request.features:
+                    self.snap_stats[feature.name] = stats
+            inverses.append(inverse)
+            fetch = request.fetch
+            calls.extend((fetch, lng, lat) for lng, lat in zip(lngs.tolist(), lats.tolist()))
+        responses, attempts = self._execute(calls, max_workers, retry_failed, call_timeout)
+        columns, failures = {}, []
+        start = 0
+        for request, inverse in zip(plan, inverses):
+            n_points = len(valid_lngs) if inverse is None else int(inverse.max(initial=-1)) + 1
+            request_responses = responses[start:start + n_points]
+            request_attempts = attempts[start:start + n_points]
+            start += n_points
+            if valid is not None:
+                inverse = _with_missing(inverse, valid, len(longitudes), n_points)
+                request_responses = request_responses + [MISSING_COORDINATES]
+                request_attempts = np.append(request_attempts, 0)
+            failures.extend(_failure_records(request.features, request_responses,
+                                             request_attempts, inverse, df.index))
+            for feature in request.features:
+                values = feature.evaluate_batch(request_responses)
+                columns[feature.name] = values if inverse is None else values[inverse]
+        if local:
+            columns.update(self._enrich_local_pois(local, longitudes, latitudes,
+                                                   tile_degrees, max_workers, failures,
+                                                   df.index, retry_failed, call_timeout))
+        self.failures = _failure_table(failures)
+        # Hand each column to pandas as a Series so it is not copied again
+        for feature in self.features:
+            enriched_df[feature.name] = pd.Series(columns.pop(feature.name),
+                                                  index=enriched_df.index, copy=False)
+        enriched_df.attrs[FINGERPRINTS_ATTR] = self.fingerprints()
+        return None if inplace else enriched_df
+
+    def iter_enrich(self, rows: Iterable[Tuple], max_workers: int = 8,
+                    max_in_flight: int = None, row_timeout: float = None) -> Iterator[dict]:
+        """Enrich a stream of points, yielding each as soon as all of its
+        features are computed.
+
+        At most `max_in_flight` rows are read ahead of the consumer and
+        being enriched at any time, so `rows` may be unbounded and memory
+        use stays constant. Records are yielded in order of completion,
+        not input order. Closing the generator cancels queued requests.
+
+        Parameters
+        ----------
+        rows : iterable of tuple
+            `(id, longitude, latitude)` of each point
+        max_workers : int
+            Number of threads issuing API calls concurrently
+        max_in_flight : int, optional
+            Maximum number of rows being enriched at once; defaults to
+            twice `max_workers`
+        row_timeout : float, optional
+            Seconds from when a row is read until all of its requests must
+            be answered; features still pending then are None. Unlike
+            `call_timeout` in `enrich_dataframe`, this is one deadline
+            shared by all of the row's requests.
+
+        Yields
+        ------
+        record : dict
+            `id`, `longitude`, `latitude` and the value of every feature,
+            None where it could not be computed
+        """
+        plan = self.plan()
+        max_in_flight = max_in_flight or 2 * max_workers
+        rows = iter(rows)
+        executor = ThreadPoolExecutor(max_workers=max_workers)
+        in_flight = {}  # future -> (record, request)
+        remaining = {}  # row id -> requests not yet answered
+        try:
+            while True:
+                while len(remaining) < max_in_flight:
+                    row = next(rows, None)
+                    if row is None:
+                        break
+                    row_id, lng, lat = row
+                    record = {"id": row_id, "longitude": lng, "latitude": lat}
+                    if not plan:
+                        yield record
+                        continue
+                    remaining[id(record)] = len(plan)
+                    deadline = None if row_timeout is None else time.monotonic() + row_timeout
+                    for request in plan:
+                        point = (lng, lat)
+                        if request.snap_precision is not None:
+                            point = (float(c[0]) for c in snap_to_geohash(
+                                [lng], [lat], request.snap_precision))
+                        future = executor.submit(_fetch_safely, request.fetch, *point,
+                                                 deadline=deadline)
+                        in_flight[future] = (record, request)
+                if not in_flight:
+                    return
+                done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+                for future in done:
+                    record, request = in_flight.pop(future)
+                    response = future.result()
+                    for feature in request.features:
+                        record[feature.name] = feature.evaluate(response)
+                    remaining[id(record)] -= 1
+                    if remaining[id(record)] == 0:
+                        del remaining[id(record)]
+                        yield record
+        finally:
+            executor.shutdown(wait=True, cancel_futures=True)
+
+    def update_dataframe(self, df, previous, longitude_col: str = None,
+                         latitude_col: str = None, fingerprints: dict = None, **kwargs):
+        """Incrementally re-enrich a data frame from a previous output.
+
+        Rows are matched to `previous` on the index. All features are
+        computed for rows that are new or whose coordinates changed. Only
+        features whose definition (see `IggyFeature.fingerprint`) changed,
+        or that are missing from `previous`, are computed for the other
+        rows; the remaining values are carried over.
+
+        Parameters
+        ----------
+        df : pd.DataFrame or gpd.GeoDataFrame
+            Current input data frame, with a unique index
+        previous : pd.DataFrame or gpd.GeoDataFrame
+            Output of an earlier `enrich_dataframe` or `update_dataframe`
+        latitude_col : str
+            name of latitude column for pandas DataFrame input
+        longitude_col : str
+            name of longitude column for pandas DataFrame input
+        fingerprints : dict, optional
+            Feature fingerprints of the previous run, as returned by
+            `fingerprints()`. Defaults to those recorded in
+            `previous.attrs`, which survive pickle and parquet but not
+            CSV; without them every feature is recomputed.
+        **kwargs
+            Passed to `enrich_dataframe`, e.g. `max_workers`. `inplace`
+            and `meta` are not supported.
+
+        Returns
+        -------
+        enriched_df : pd.DataFrame or gpd.GeoDataFrame (same type as input)
+        """
+        _check_passthrough("update_dataframe", kwargs)
+        if not (df.index.is_unique and previous.index.is_unique):
+            logger.error('`update_dataframe` requires data frames with unique indexes')
+            raise ValueError
+        if fingerprints is None:
+            fingerprints = previous.attrs.get(FINGERPRINTS_ATTR, {})
+        stale = [f for f in self.features
+                 if f.name not in previous.columns or fingerprints.get(f.name) != f.fingerprint]
+
+        changed = ~df.index.isin(previous.index)
+        known = np.flatnonzero(~changed)
+        longitudes, latitudes = self._coordinates(df.iloc[known], longitude_col, latitude_col)
+        prev_longitudes, prev_latitudes = self._coordinates(
+            previous.loc[df.index[known]], longitude_col, latitude_col)
+        changed[known] = ~(_same_values(longitudes, prev_longitudes)
+                           & _same_values(latitudes, prev_latitudes))
+        logger.info(f"Re-enriching {changed.sum()} new or moved rows of {len(df)}, "
+                    f"and {len(stale)} changed features for all rows")
+
+        pieces = {feature.name: [] for feature in self.features}
+        failures = []
+        if changed.any():
+            delta = self.enrich_dataframe(df[changed], longitude_col=longitude_col,
+                                          latitude_col=latitude_col, **kwargs)
+            failures.append(self.failures)
+            for feature in self.features:
+                pieces[feature.name].append(delta[feature.name])
+        unchanged = df.index[~changed]
+        if len(unchanged):
+            if stale:
+                stale_set = IggyFeatureSet(stale)
+                refreshed = stale_set.enrich_dataframe(
+                    df.loc[unchanged], longitude_col=longitude_col,
+                    latitude_col=latitude_col, **kwargs)
+                failures.append(stale_set.failures)
+            for feature in self.features:
+                source = refreshed if feature in stale else previous
+                pieces[feature.name].append(source.loc[unchanged, feature.name])
         enriched_df = df.copy()
-        if isinstance(df, gpd.GeoDataFrame):
-            points = df.geometry
-        else:
-            points = [Point(lng, lat) for lng, lat in zip(df[longitude_col], df[latitude_col])]
-            points = gpd.GeoSeries(points)
         for feature in self.features:
-            enriched_df[feature.name] = points.apply(lambda p: feature.calculate(p.x, p.y))
+            column = pd.concat(pieces[feature.name]) if pieces[feature.name] \
+                else pd.Series(dtype=feature.dtype)
+            enriched_df[feature.name] = column.reindex(df.index)
+        enriched_df.attrs[FINGERPRINTS_ATTR] = self.fingerprints()
+        self.failures = _concat_failures(failures)
         return enriched_df
+
+    def retry_failures(self, enriched_df, longitude_col: str = None,
+                       latitude_col: str = None, failures=None, **kwargs):
+        """Re-run only the (row, feature) pairs that failed in a previous
+        enrichment, and fill in their values.
+
+        Parameters
+        ----------
+        enriched_df : pd.DataFrame or gpd.GeoDataFrame
+            Output of `enrich_dataframe`, with a unique index
+        latitude_col : str
+            name of latitude column for pandas DataFrame input
+        longitude_col : str
+            name of longitude column for pandas DataFrame input
+        failures : pd.DataFrame, optional
+            Failure table of that enrichment; defaults to `failures`
+        **kwargs
+            Passed to `enrich_dataframe`, e.g. `retry_failed`. `inplace`
+            and `meta` are not supported.
+
+        Returns
+        -------
+        enriched_df : pd.DataFrame or gpd.GeoDataFrame (same type as input)
+            A copy of `enriched_df` with the recomputed values. The pairs
+            that failed again are left in `failures`.
+        """
+        _check_passthrough("retry_failures", kwargs)
+        failures = self.failures if failures is None else failures
+        retried = enriched_df.copy()
+        features = [f for f in self.features
+                    if failures is not None and f.name in set(failures.feature)]
+        if not features:
+            self.failures = _failure_table([])
+            return retried
+        rows = pd.unique(failures.row)
+        logger.info(f"Retrying {len(failures)} failed values in {len(rows)} rows")
+        failed_set = IggyFeatureSet(features)
+        redone = failed_set.enrich_dataframe(enriched_df.loc[rows], longitude_col=longitude_col,
+                                             latitude_col=latitude_col, **kwargs)
+        for feature in features:
+            feature_rows = failures.row[failures.feature == feature.name].unique()
+            column = retried[feature.name].copy()
+            column.loc[feature_rows] = redone.loc[feature_rows, feature.name].to_numpy()
+            retried[feature.name] = column
+        # other features were recomputed for the failed rows too; only the
+        # pairs being retried count as failures again
+        pairs = set(zip(failures.row, failures.feature))
+        remaining = failed_set.failures
+        self.failures = remaining[[p in pairs for p in zip(remaining.row, remaining.feature)]] \
+            .reset_index(drop=True)
+        return retried
+
+    def fingerprints(self) -> dict:
+        """Fingerprints of the features, keyed on feature name"""
+        return {feature.name: feature.fingerprint for feature in self.features}
+
+    def _enrich_polygons(self, df, max_workers: int, dedupe: bool,
+                         retry_failed: RetryPolicy = None, call_timeout: float = None) -> dict:
+        """Columns of POI count features for a GeoDataFrame of polygons,
+        with one POST request per (unique) polygon and label/brand group"""
+        unsupported = [f.name for f in self.features
+                       if not isinstance(f, IggyPOIFeature) or f.calc.calc_method != 'count']
+        if unsupported:
+            logger.error('Only `IggyPOIFeature`s with `count` can be computed for polygons, '
+                         f'not: {", ".join(unsupported)}')
+            raise ValueError
+        # polygons are sent as they are, never snapped
+        self.snap_stats = {}
+        geometry = df.geometry
+        if dedupe:
+            codes, _ = pd.factorize(geometry.to_wkb())
+            _, first = np.unique(codes, return_index=True)
+            if len(first) and codes[first[0]] == -1:
+                first = first[1:]
+            unique = geometry.iloc[first]
+        else:
+            present = ~geometry.isna().to_numpy()
+            codes = np.full(len(geometry), -1)
+            codes[present] = np.arange(present.sum())
+            unique = geometry[present]
+        # Serialize all polygons at once rather than row by row
+        geojsons = [f["geometry"] for f in unique.__geo_interface__["features"]]
+
+        groups = {}
+        for feature in self.features:
+            key = next(k for k in feature.merge_params if k in feature.params)
+            value = feature.params[key]
+            request = groups.setdefault((id(feature.api), key), IggyRequest(
+                feature.api, feature.endpoint, {key: value}, []))
+            values = request.params[key].split(',')
+            if value not in values:
+                request.params[key] = ','.join(values + [value])
+            request.features.append(feature)
+        calls = [(request.fetch_polygon, g) for request in groups.values() for g in geojsons]
+        responses, attempts = self._execute(calls, max_workers, retry_failed, call_timeout)
+
+        columns, failures = {}, []
+        error = {"message": "Missing geometry"}
+        n = len(geojsons)
+        positions = np.where(codes == -1, n, codes)
+        for k, request in enumerate(groups.values()):
+            # missing geometries point at a trailing error response
+            request_responses = responses[k * n:(k + 1) * n] + [error]
+            failures.extend(_failure_records(request.features, request_responses,
+                                             np.append(attempts[k * n:(k + 1) * n], 0),
+                                             positions, df.index))
+            for feature in request.features:
+                columns[feature.name] = feature.evaluate_batch(request_responses)[positions]
+        self.failures = _failure_table(failures)
+        return columns
+
+    def _enrich_local_pois(self, features: List, longitudes: np.ndarray,
+                           latitudes: np.ndarray, tile_degrees: float,
+                           max_workers: int, failures: List, index,
+                           retry_failed: RetryPolicy = None,
+                           call_timeout: float = None) -> dict:
+        """Columns of POI features computed from a local index of the POIs
+        around the points, fetched once per API client
+
+        Tile requests are retried and recorded like any other request; a
+        row needing a tile that could not be fetched fails with that
+        tile's error.
+        """
+        columns = {}
+        by_api = {}
+        for feature in features:
+            by_api.setdefault(id(feature.api), []).append(feature)
+        for group in by_api.values():
+            within_miles = max(f.params['within_miles'] for f in group)
+            tiles, ranges = tiles_covering(longitudes, latitudes, within_miles, tile_degrees)
+            calls = tile_calls(
+                tiles,
+                labels=sorted({f.params['labels'] for f in group if 'labels' in f.params}),
+                brands=sorted({f.params['brands'] for f in group if 'brands' in f.params}))
+            responses, attempts = self._execute(
+                [(fetch_tile, group[0].api, *call, tile_degrees) for call in calls],
+                max_workers, retry_failed, call_timeout)
+            poi_index = POIIndex.from_responses(calls, responses)
+            # every row points at its own response, or at the first failed
+            # call among the tiles it needs
+            n = len(longitudes)
+            failed = [i for i, r in enumerate(responses) if "message" in r]
+            positions = np.arange(n)
+            for k, i in enumerate(failed):
+                positions[covers(ranges, calls[i][0]) & (positions < n)] = n + k
+            errors = [responses[i] for i in failed]
+            error_attempts = attempts[failed]
+            invalid = np.isnan(ranges).any(axis=1)
+            if invalid.any():
+                positions[invalid] = n + len(errors)
+                errors.append(MISSING_COORDINATES)
+                error_attempts = np.append(error_attempts, 0)
+            for feature in group:
+                key = feature.params.get('labels') or feature.params['brands']
+                distances = poi_index.distances(key, longitudes, latitudes,
+                                                feature.params['within_miles'])
+                feature_responses = [{key: [{'straight_line_distance_miles': d}
+                                            for d in ds.tolist()]} for ds in distances]
+                feature_responses += errors
+                failures.extend(_failure_records(
+                    [feature], feature_responses,
+                    np.append(np.ones(n, dtype=np.int64), error_attempts),
+                    positions, index))
+                columns[feature.name] = feature.evaluate_batch(feature_responses)[positions]
+        return columns
+
+    def _enrich_processes(self, df, longitude_col: str, latitude_col: str,
+                          processes: int, **kwargs):
+        bounds = np.linspace(0, len(df), min(processes, len(df)) + 1).astype(int)
+        partitions = [df.iloc[start:stop] for start, stop in zip(bounds[:-1], bounds[1:])]
+        n = len(partitions)
+        with ProcessPoolExecutor(max_workers=n) as executor:
+            results = list(executor.map(_enrich_partition, [self] * n, partitions,
+                                        [longitude_col] * n, [latitude_col] * n,
+                                        [kwargs] * n))
+        for i, api in enumerate(self._apis()):
+            for _, _, metrics, _ in results:
+                api.metrics.merge(metrics[i])
+        names = {name for _, snap_stats, _, _ in results for name in snap_stats}
+        self.snap_stats = {name: _merge_snap_stats([r[1][name] for r in results])
+                           for name in names}
+        self.failures = _concat_failures([failures for _, _, _, failures in results])
+        return pd.concat([enriched for enriched, _, _, _ in results])
+
+    def _enrich_partitioned(self, df, longitude_col: str, latitude_col: str,
+                            meta: dict, **kwargs):
+        dtypes = {feature.name: feature.dtype for feature in self.features}
+        dtypes.update(meta or {})
+        return df.map_partitions(_enrich_partition_frame, self, longitude_col,
+                                 latitude_col, dtypes, kwargs,
+                                 meta=_with_empty_columns(df._meta, dtypes))
+
+    def __dask_tokenize__(self):
+        # Tasks are named after a hash of their arguments; identify the
+        # feature set by a per-instance token instead of hashing its clients
+        if '_token' not in self.__dict__:
+            self._token = uuid.uuid4().hex
+        return self._token
+
+    def __getstate__(self):
+        # Results of earlier runs stay with the original. The API clients
+        # are shared by all copies unpickled in a worker, see IggyAPI.
+        state = {k: v for k, v in self.__dict__.items() if k != '_token'}
+        state.update(snap_stats={}, failures=None)
+        return state
+
+    def _apis(self) -> List[IggyAPI]:
+        """Distinct API clients used by the features, in order of first use"""
+        return list({id(feature.api): feature.api for feature in self.features}.values())
+
+    def _coordinates(self, df, longitude_col: str, latitude_col: str) \
+            -> Tuple[np.ndarray, np.ndarray]:
+        """Longitudes and latitudes of the rows as float64 arrays"""
+        if _is_geodataframe(df):
+            return (df.geometry.x.to_numpy(dtype=np.float64),
+                    df.geometry.y.to_numpy(dtype=np.float64))
+        return (df[longitude_col].to_numpy(dtype=np.float64),
+                df[latitude_col].to_numpy(dtype=np.float64))
+
+    def enrich_file(self, input_path: str, output_path: str, longitude_col: str,
+                    latitude_col: str, chunksize: int = 100000,
+                    checkpoint_path: str = None, **kwargs) -> int:
+        """Enrich a CSV or Parquet file too large to fit in memory.
+
+        The input is read in chunks of `chunksize` rows; each chunk is
+        enriched with `enrich_dataframe` and appended to the output, then
+        a checkpoint is recorded. If the job is interrupted, calling
+        `enrich_file` again with the same arguments resumes after the last
+        completed chunk instead of re-requesting rows already done. Delete
+        the output and checkpoint to start over.
+
+        Parameters
+        ----------
+        input_path : str
+            CSV file, or Parquet file if the name ends in `.parquet`
+        output_path : str
+            CSV file, or directory of Parquet parts if the name ends in
+            `.parquet`
+        longitude_col : str
+            name of longitude column
+        latitude_col : str
+            name of latitude column
+        chunksize : int
+            Number of rows held in memory at a time
+        checkpoint_path : str, optional
+            Defaults to `output_path` + `.checkpoint`
+        **kwargs
+            Passed to `enrich_dataframe`, e.g. `max_workers`
+
+        Returns
+        -------
+        rows : int
+            Total number of rows in the output
+        """
+        checkpoint = Checkpoint(checkpoint_path or f"{output_path}.checkpoint")
+        if checkpoint.complete:
+            logger.info(f"{output_path} is already complete")
+            return checkpoint.rows_done
+        writer = ChunkWriter(output_path, checkpoint.output_position)
+        for chunk in read_chunks(input_path, chunksize, checkpoint.rows_done):
+            self.enrich_dataframe(chunk, longitude_col=longitude_col,
+                                  latitude_col=latitude_col, inplace=True, **kwargs)
+            writer.write(chunk)
+            checkpoint.rows_done += len(chunk)
+            checkpoint.output_position = writer.position
+            checkpoint.save()
+        checkpoint.complete = True
+        checkpoint.save()
+        return checkpoint.rows_done
+
+    def plan(self) -> List[IggyRequest]:
+        """Group features into the minimal set of API requests.
+
+        Features using the same API client and endpoint, whose parameters
+        match apart from their `merge_params`, are served by one request
+        with the merge parameter values comma-joined. For example, any
+        number of `IggyLookupFeature`s cost a single `/lookup` call per
+        point. Features snapped to different grids are never merged.
+        """
+        return self._plan(self.features)
+
+    def _plan(self, features: List) -> List[IggyRequest]:
+        groups = {}
+        for feature in features:
+            merge_keys = tuple(k for k in feature.merge_params if k in feature.params)
+            shared = {k: v for k, v in feature.params.items() if k not in merge_keys}
+            group_key = (id(feature.api), feature.endpoint, merge_keys,
+                         json.dumps(shared, sort_keys=True, default=str),
+                         feature.snap_precision)
+            if group_key not in groups:
+                groups[group_key] = IggyRequest(feature.api, feature.endpoint,
+                                                deepcopy(feature.params), [],
+                                                feature.snap_precision)
+            request = groups[group_key]
+            for k in merge_keys:
+                values = request.params[k].split(',')
+                for v in str(feature.params[k]).split(','):
+                    if v not in values:
+                        values.append(v)
+                request.params[k] = ','.join(values)
+            request.features.append(feature)
+        return list(groups.values())
+
+    def _execute(self, calls: List, max_workers: int, retry: RetryPolicy = None,
+                 timeout: float = None) -> Tuple[List, np.ndarray]:
+        """Run (fetch, *args) calls, preserving input order, then re-run
+        retryable failures in up to `retry.max_retries` deferred rounds.
+
+        Connection errors are returned as error responses. Returns the
+        responses and the number of times each call was made.
+        """
+        responses = self._run(calls, max_workers, timeout)
+        attempts = np.ones(len(calls), dtype=np.int64)
+        for attempt in range(retry.max_retries if retry is not None else 0):
+            queue = [i for i, r in enumerate(responses) if _is_retryable(r, retry)]
+            if not queue:
+                break
+            delay = retry.delay(attempt)
+            logger.warning(f"Retrying {len(queue)} failed requests in {delay:.1f}s")
+            time.sleep(delay)
+            retried = self._run([calls[i] for i in queue], max_workers, timeout)
+            for i, response in zip(queue, retried):
+                responses[i] = response
+            attempts[queue] += 1
+        return responses, attempts
+
+    def _run(self, calls: List, max_workers: int, timeout: float = None) -> List:
+        def run(call):
+            # the budget starts when the call does, not when it is queued
+            deadline = None if timeout is None else time.monotonic() + timeout
+            return _fetch_safely(*call, deadline=deadline)
+
+        if max_workers <= 1:
+            return [run(c) for c in calls]
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            return list(executor.map(run, calls))
@@ -0,0 +1,205 @@
+import threading
+from collections import Counter, defaultdict
+from typing import Dict, Tuple
+
+# Upper bounds, in seconds, of the request latency histogram buckets
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+COUNTERS = ("requests", "retries", "throttled", "failures", "hedged", "hedge_wins",
+            "cache_hits", "cache_misses", "response_bytes")
+
+
+class Histogram():
+    """Fixed-bucket histogram of observed values
+
+    Parameters
+    ----------
+    buckets : tuple of float
+        Increasing upper bounds of the buckets; larger values fall into
+        an implicit `+Inf` bucket
+    """
+    def __init__(self, buckets: Tuple = DEFAULT_BUCKETS):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        i = 0
+        while i < len(self.buckets) and value > self.buckets[i]:
+            i += 1
+        self.counts[i] += 1
+        self.sum += value
+        self.count += 1
+
+    def quantile(self, q: float) -> float:
+        """Estimate the `q` quantile by interpolating within its bucket"""
+        if self.count == 0:
+            return None
+        rank = q * self.count
+        seen = 0
+        for i, n in enumerate(self.counts):
+            if n and seen + n >= rank:
+                lower = self.buckets[i - 1] if i > 0 else 0.0
+                if i == len(self.buckets):
+                    return lower
+                return lower + (self.buckets[i] - lower) * (rank - seen) / n
+            seen += n
+        return self.buckets[-1]
+
+    def merge(self, other: "Histogram"):
+        """Add the observations of a histogram with the same buckets"""
+        if other.buckets != self.buckets:
+            raise ValueError("Cannot merge histograms with different buckets")
+        self.counts = [a + b for a, b in zip(self.counts, other.counts)]
+        self.sum += other.sum
+        self.count += other.count
+
+    def copy(self) -> "Histogram":
+        histogram = Histogram(self.buckets)
+        histogram.counts = list(self.counts)
+        histogram.sum = self.sum
+        histogram.count = self.count
+        return histogram
+
+    def since(self, earlier: "Histogram") -> "Histogram":
+        """Observations added since `earlier`, a copy of this histogram"""
+        delta = Histogram(self.buckets)
+        delta.counts = [a - b for a, b in zip(self.counts, earlier.counts)]
+        delta.sum = self.sum - earlier.sum
+        delta.count = self.count - earlier.count
+        return delta
+
+    def snapshot(self) -> Dict:
+        return {
+            "buckets": dict(zip([*self.buckets, float("inf")], self.counts)),
+            "sum": self.sum,
+            "count": self.count,
+            "p50": self.quantile(0.5),
+            "p95": self.quantile(0.95),
+            "p99": self.quantile(0.99),
+        }
+
+
+class Metrics():
+    """Thread-safe per-endpoint request metrics of an IggyAPI client
+
+    Tracks, for each endpoint, the number of requests sent (including
+    retries), errors by HTTP status, a latency histogram, bytes received
+    and counts of retries, throttled responses, final failures, hedged
+    requests (and how often the duplicate answered first) and cache
+    hits/misses.
+
+    Parameters
+    ----------
+    buckets : tuple of float
+        Latency histogram bucket bounds in seconds
+    """
+    def __init__(self, buckets: Tuple = DEFAULT_BUCKETS):
+        self.buckets = buckets
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self._counters = defaultdict(Counter)
+            self._errors = defaultdict(Counter)
+            self._latency = defaultdict(lambda: Histogram(self.buckets))
+
+    def record_response(self, endpoint: str, status, elapsed: float,
+                        response_bytes: int = 0):
+        """Record one HTTP attempt; `status` is the HTTP status code, or the
+        exception name if no response was received"""
+        with self._lock:
+            self._counters[endpoint]["requests"] += 1
+            self._counters[endpoint]["response_bytes"] += response_bytes
+            self._latency[endpoint].observe(elapsed)
+            if not isinstance(status, int) or status >= 400:
+                self._errors[endpoint][str(status)] += 1
+
+    def __getstate__(self):
+        with self._lock:
+            return {"buckets": self.buckets,
+                    "counters": {e: dict(c) for e, c in self._counters.items()},
+                    "errors": {e: dict(c) for e, c in self._errors.items()},
+                    "latency": dict(self._latency)}
+
+    def __setstate__(self, state):
+        self.__init__(state["buckets"])
+        self._counters.update((e, Counter(c)) for e, c in state["counters"].items())
+        self._errors.update((e, Counter(c)) for e, c in state["errors"].items())
+        self._latency.update(state["latency"])
+
+    def merge(self, other: "Metrics"):
+        """Add the metrics recorded by `other`, e.g. by a copy of the
+        client in a worker process"""
+        state = other.__getstate__()
+        with self._lock:
+            for endpoint, counts in state["counters"].items():
+                self._counters[endpoint].update(counts)
+            for endpoint, counts in state["errors"].items():
+                self._errors[endpoint].update(counts)
+            for endpoint, histogram in state["latency"].items():
+                self._latency[endpoint].merge(histogram)
+
+    def since(self, earlier: "Metrics") -> "Metrics":
+        """Metrics recorded since `earlier`, a copy of these metrics"""
+        state, old = self.__getstate__(), earlier.__getstate__()
+        delta = Metrics(self.buckets)
+        for endpoint, counts in state["counters"].items():
+            delta._counters[endpoint] = Counter(counts) - Counter(old["counters"].get(endpoint))
+        for endpoint, counts in state["errors"].items():
+            delta._errors[endpoint] = Counter(counts) - Counter(old["errors"].get(endpoint))
+        for endpoint, histogram in state["latency"].items():
+            delta._latency[endpoint] = histogram.since(
+                old["latency"].get(endpoint) or Histogram(self.buckets))
+        return delta
+
+    def increment(self, endpoint: str, name: str, value: int = 1):
+        with self._lock:
+            self._counters[endpoint][name] += value
+
+    def latency(self, endpoint: str) -> Histogram:
+        """Copy of the latency histogram of `endpoint`, safe to read while
+        other threads record responses"""
+        with self._lock:
+            return self._latency[endpoint].copy()
+
+    def snapshot(self) -> Dict:
+        """Per-endpoint metrics as a plain dict"""
+        with self._lock:
+            endpoints = set(self._counters) | set(self._errors) | set(self._latency)
+            return {
+                endpoint: {
+                    **{name: self._counters[endpoint][name] for name in COUNTERS},
+                    "errors": dict(self._errors[endpoint]),
+                    "latency": self._latency[endpoint].snapshot(),
+                }
+                for endpoint in sorted(endpoints)
+            }
+
+    def to_prometheus(self, prefix: str = "iggy") -> str:
+        """Metrics in the Prometheus text exposition format"""
+        snapshot = self.snapshot()
+        lines = []
+        for name in COUNTERS:
+            metric = f"{prefix}_{name}_total"
+            lines.append(f"# TYPE {metric} counter")
+            for endpoint, m in snapshot.items():
+                lines.append(f'{metric}{{endpoint="{endpoint}"}} {m[name]}')
+        metric = f"{prefix}_errors_total"
+        lines.append(f"# TYPE {metric} counter")
+        for endpoint, m in snapshot.items():
+            for status, n in sorted(m["errors"].items()):
+                lines.append(f'{metric}{{endpoint="{endpoint}",status="{status}"}} {n}')
+        metric = f"{prefix}_request_latency_seconds"
+        lines.append(f"# TYPE {metric} histogram")
+        for endpoint, m in snapshot.items():
+            cumulative = 0
+            for bound, n in m["latency"]["buckets"].items():
+                cumulative += n
+                le = "+Inf" if bound == float("inf") else repr(bound)
+                lines.append(f'{metric}_bucket{{endpoint="{endpoint}",le="{le}"}} {cumulative}')
+            lines.append(f'{metric}_sum{{endpoint="{endpoint}"}} {m["latency"]["sum"]}')
+            lines.append(f'{metric}_count{{endpoint="{endpoint}"}} {m["latency"]["count"]}')
+        return "\n".join(lines) + "\n"
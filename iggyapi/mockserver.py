@@ -0,0 +1,344 @@
+"""Local stand-in for the Iggy API, for offline tests and benchmarks.
+
+`MockIggyServer` serves deterministic, realistically shaped payloads
+for the public endpoints over real HTTP, with configurable latency,
+jitter and error rates:
+
+    with MockIggyServer(latency=0.05, error_rate=0.01) as server:
+        myapi = IggyAPI("any-token", base_url=server.base_url)
+        myapi.lookup(options)
+
+Responses depend only on the request, so repeated or nearby queries
+see a consistent world: POIs are laid out on a fixed pseudo-random grid
+and every query returns those within its radius or polygon.
+
+It can also be run standalone: `python -m iggyapi.mockserver --port 8080`,
+which prints the base URL on its first line of output.
+"""
+import argparse
+import json
+import math
+import random
+import threading
+import time
+import zlib
+from functools import lru_cache
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List
+from urllib.parse import parse_qs, urlparse
+
+CELL_DEGREES = 0.01
+POIS_PER_CELL = 2
+EARTH_RADIUS_MILES = 3958.8
+MILES_PER_MINUTE = {
+    "within_minutes_driving": 0.5,
+    "within_minutes_biking": 0.2,
+    "within_minutes_walking": 0.05,
+}
+LABELS = ["bars", "book_stores", "coffee_shops", "grocery_stores", "parks",
+          "pharmacies", "restaurants", "schools", "warehouses"]
+BRANDS = ["Starbucks", "Target", "Walgreens"]
+
+
+def _seed(*parts) -> int:
+    return zlib.crc32("|".join(str(p) for p in parts).encode("utf-8"))
+
+
+def haversine_miles(lng1: float, lat1: float, lng2: float, lat2: float) -> float:
+    phi1, phi2 = math.radians(lat1), math.radians(lat2)
+    dphi = phi2 - phi1
+    dlmb = math.radians(lng2 - lng1)
+    a = math.sin(dphi / 2) ** 2 + math.cos(phi1) * math.cos(phi2) * math.sin(dlmb / 2) ** 2
+    return 2 * EARTH_RADIUS_MILES * math.asin(math.sqrt(a))
+
+
+@lru_cache(maxsize=100000)
+def _cell_pois(key: str, i: int, j: int) -> List[Dict]:
+    rng = random.Random(_seed(key, i, j))
+    return [{"name": f"{key} {i}:{j}:{k}",
+             "longitude": round((i + rng.random()) * CELL_DEGREES, 6),
+             "latitude": round((j + rng.random()) * CELL_DEGREES, 6)}
+            for k in range(rng.randint(0, POIS_PER_CELL))]
+
+
+def _pois_in_bbox(key: str, min_lng: float, min_lat: float,
+                  max_lng: float, max_lat: float) -> List[Dict]:
+    pois = []
+    for i in range(math.floor(min_lng / CELL_DEGREES), math.floor(max_lng / CELL_DEGREES) + 1):
+        for j in range(math.floor(min_lat / CELL_DEGREES), math.floor(max_lat / CELL_DEGREES) + 1):
+            pois.extend(p for p in _cell_pois(key, i, j)
+                        if min_lng <= p["longitude"] <= max_lng
+                        and min_lat <= p["latitude"] <= max_lat)
+    return pois
+
+
+def _in_ring(lng: float, lat: float, ring: List) -> bool:
+    inside = False
+    for (x1, y1), (x2, y2) in zip(ring, ring[1:] + ring[:1]):
+        if (y1 > lat) != (y2 > lat) and lng < (x2 - x1) * (lat - y1) / (y2 - y1) + x1:
+            inside = not inside
+    return inside
+
+
+def _radius_miles(params: Dict) -> float:
+    if "within_miles" in params:
+        return float(params["within_miles"])
+    for key, speed in MILES_PER_MINUTE.items():
+        if key in params:
+            return float(params[key]) * speed
+    return 1.0
+
+
+def _circle(lng: float, lat: float, radius_miles: float, n: int = 16) -> Dict:
+    dlat = radius_miles / 69.0
+    dlng = dlat / max(math.cos(math.radians(lat)), 1e-6)
+    ring = [[round(lng + dlng * math.cos(2 * math.pi * k / n), 6),
+             round(lat + dlat * math.sin(2 * math.pi * k / n), 6)] for k in range(n)]
+    return {"type": "Polygon", "coordinates": [ring + ring[:1]]}
+
+
+def _keys(params: Dict) -> List[str]:
+    return [key for name in ("labels", "brands") if params.get(name)
+            for key in params[name].split(",")]
+
+
+def lookup(params: Dict) -> Dict:
+    lng, lat = float(params["longitude"]), float(params["latitude"])
+    cell = (math.floor(lng / CELL_DEGREES), math.floor(lat / CELL_DEGREES))
+    response = {}
+    for label in params.get("labels", "").split(","):
+        value = round(random.Random(_seed(label, *cell)).uniform(0, 5000), 1)
+        key = "air_quality_index" if label == "air_quality" else "value"
+        response[label] = {key: value}
+    return response
+
+
+def points_of_interest(params: Dict) -> Dict:
+    lng, lat = float(params["longitude"]), float(params["latitude"])
+    radius = _radius_miles(params)
+    dlat = radius / 69.0
+    dlng = dlat / max(math.cos(math.radians(lat)), 1e-6)
+    response = {}
+    for key in _keys(params):
+        pois = []
+        for poi in _pois_in_bbox(key, lng - dlng, lat - dlat, lng + dlng, lat + dlat):
+            distance = haversine_miles(lng, lat, poi["longitude"], poi["latitude"])
+            if distance <= radius:
+                pois.append(dict(poi, straight_line_distance_miles=round(distance, 2)))
+        response[key] = sorted(pois, key=lambda p: p["straight_line_distance_miles"])
+    return response
+
+
+def points_of_interest_polygon(params: Dict, body: Dict) -> Dict:
+    if body.get("type") != "Feature":
+        raise ValueError("body must be a GeoJSON Feature")
+    geometry = body["geometry"]
+    polygons = geometry["coordinates"]
+    if geometry["type"] == "Polygon":
+        polygons = [polygons]
+    response = {}
+    for key in _keys(params):
+        pois = []
+        for polygon in polygons:
+            ring = polygon[0]
+            lngs, lats = [p[0] for p in ring], [p[1] for p in ring]
+            pois.extend(p for p in _pois_in_bbox(key, min(lngs), min(lats), max(lngs), max(lats))
+                        if _in_ring(p["longitude"], p["latitude"], ring))
+        response[key] = pois
+    return response
+
+
+def amenities_score(params: Dict) -> Dict:
+    pois = points_of_interest(dict(params, labels=",".join(LABELS)))
+    return {"score": round(sum(min(len(v), 10) for v in pois.values()) / (10 * len(LABELS)), 6)}
+
+
+def isochrone(params: Dict) -> Dict:
+    lng, lat = float(params["longitude"]), float(params["latitude"])
+    return {"type": "Feature", "properties": {"bucket": 0},
+            "geometry": _circle(lng, lat, _radius_miles(params))}
+
+
+def clusters(params: Dict) -> Dict:
+    lng, lat = float(params["longitude"]), float(params["latitude"])
+    category = params.get("category", "restaurants")
+    pois = points_of_interest(dict(params, labels=category))[category]
+    result = []
+    for k in range(0, len(pois), 3):
+        group = pois[k:k + 3]
+        c_lng = sum(p["longitude"] for p in group) / len(group)
+        c_lat = sum(p["latitude"] for p in group) / len(group)
+        result.append({
+            "geojson": {"type": "Feature", "properties": {},
+                        "geometry": _circle(c_lng, c_lat, 0.1, n=6)},
+            "summary": {"place_names": [p["name"] for p in group]},
+        })
+    return {"clusters": result}
+
+
+def points_of_interest_options(params: Dict) -> Dict:
+    return {"labels": LABELS, "brands": BRANDS}
+
+
+GET_ENDPOINTS = {
+    "lookup": lookup,
+    "points_of_interest": points_of_interest,
+    "amenities_score": amenities_score,
+    "isochrone": isochrone,
+    "clusters": clusters,
+    "points_of_interest_options": points_of_interest_options,
+}
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    # Avoid Nagle/delayed-ACK stalls between header and body writes on
+    # keep-alive connections
+    disable_nagle_algorithm = True
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        self._handle("GET")
+
+    def do_POST(self):
+        self._handle("POST")
+
+    def _handle(self, method: str):
+        mock = self.server.mock
+        url = urlparse(self.path)
+        params = {k: v[-1] for k, v in parse_qs(url.query).items()}
+        length = int(self.headers.get("Content-Length") or 0)
+        raw_body = self.rfile.read(length) if length else b""
+        mock._record(url.path)
+        time.sleep(mock._delay())
+
+        endpoint = url.path.rsplit("/", 1)[-1]
+        if not self.headers.get("X-Iggy-Token"):
+            return self._send(401, {"message": "Missing X-Iggy-Token header"})
+        failure = mock._failure()
+        if failure == 429:
+            return self._send(429, {"message": "Too many requests"},
+                              {"Retry-After": "0"})
+        if failure:
+            return self._send(failure, None)
+        try:
+            if method == "POST" and endpoint == "points_of_interest":
+                payload = points_of_interest_polygon(params, json.loads(raw_body or b"{}"))
+            elif method == "GET" and endpoint in GET_ENDPOINTS:
+                payload = GET_ENDPOINTS[endpoint](params)
+            else:
+                return self._send(404, {"message": f"Unknown endpoint {url.path}"})
+        except (KeyError, ValueError, TypeError) as e:
+            return self._send(400, {"message": f"Invalid request: {e}"})
+        self._send(200, payload)
+
+    def _send(self, status: int, payload: Dict, headers: Dict = None):
+        if payload is None:
+            body = b"<html>Service Unavailable</html>"
+            content_type = "text/html"
+        else:
+            body = json.dumps(payload).encode("utf-8")
+            content_type = "application/json"
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        for k, v in (headers or {}).items():
+            self.send_header(k, v)
+        self.end_headers()
+        self.wfile.write(body)
+
+
+class MockIggyServer():
+    """Local HTTP server imitating the Iggy API
+
+    Parameters
+    ----------
+    latency : float
+        Base delay in seconds added to every response
+    jitter : float
+        Extra random delay, uniform between 0 and `jitter` seconds
+    error_rate : float
+        Fraction of requests answered with a retryable error instead,
+        split between 429 (with `Retry-After: 0`) and 503
+    seed : int, optional
+        Seed for latency and error injection
+    host : str
+    port : int
+        0 (default) picks a free port
+    """
+    def __init__(self, latency: float = 0.0, jitter: float = 0.0,
+                 error_rate: float = 0.0, seed: int = None,
+                 host: str = "127.0.0.1", port: int = 0):
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.request_counts = {}
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self._httpd = ThreadingHTTPServer((host, port), _Handler)
+        self._httpd.daemon_threads = True
+        self._httpd.mock = self
+        self._thread = None
+
+    @property
+    def base_url(self) -> str:
+        host, port = self._httpd.server_address[:2]
+        return f"http://{host}:{port}/v1/"
+
+    @property
+    def request_count(self) -> int:
+        return sum(self.request_counts.values())
+
+    def _record(self, path: str):
+        with self._lock:
+            self.request_counts[path] = self.request_counts.get(path, 0) + 1
+
+    def _delay(self) -> float:
+        with self._lock:
+            return self.latency + self._random.uniform(0, self.jitter)
+
+    def _failure(self) -> int:
+        with self._lock:
+            if self._random.random() >= self.error_rate:
+                return 0
+            return self._random.choice([429, 503])
+
+    def start(self) -> "MockIggyServer":
+        self._thread = threading.Thread(target=self._httpd.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._httpd.shutdown()
+        self._httpd.server_close()
+        if self._thread is not None:
+            self._thread.join()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run a local mock Iggy API server")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--latency", type=float, default=0.0)
+    parser.add_argument("--jitter", type=float, default=0.0)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    args = parser.parse_args()
+    server = MockIggyServer(args.latency, args.jitter, args.error_rate,
+                            host=args.host, port=args.port)
+    print(server.base_url, flush=True)
+    try:
+        server._httpd.serve_forever()
+    except KeyboardInterrupt:
+        server._httpd.server_close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,151 @@
+import logging
+import math
+from typing import Dict, List, Sequence, Tuple
+
+import numpy as np
+
+from iggyapi.api import IggyAPI
+from iggyapi.grid import EARTH_RADIUS_M, haversine_m
+
+logger = logging.getLogger(__name__)
+
+METERS_PER_MILE = 1609.344
+DEGREES_PER_MILE = METERS_PER_MILE / (EARTH_RADIUS_M * math.pi / 180)
+# About 3.5 x 3.5 miles at the equator
+DEFAULT_TILE_DEGREES = 0.05
+
+
+def _radius_degrees(latitudes: np.ndarray, within_miles: float) \
+        -> Tuple[np.ndarray, float]:
+    """Half-width and half-height in degrees of boxes enclosing circles of
+    `within_miles` around points at `latitudes`"""
+    dlat = within_miles * DEGREES_PER_MILE
+    max_lat = np.minimum(np.abs(latitudes) + dlat, 89.9)
+    return dlat / np.cos(np.radians(max_lat)), dlat
+
+
+def tiles_covering(longitudes: np.ndarray, latitudes: np.ndarray, within_miles: float,
+                   tile_degrees: float = DEFAULT_TILE_DEGREES) \
+        -> Tuple[List[Tuple[int, int]], np.ndarray]:
+    """Grid tiles needed to find all POIs within `within_miles` of points
+
+    :return: tuple
+        The sorted `(i, j)` indices of the tiles, where tile `(i, j)`
+        spans `i * tile_degrees` to `(i + 1) * tile_degrees` in longitude
+        and likewise `j` in latitude, and for every point the
+        `(i_min, i_max, j_min, j_max)` range of tiles it needs (NaN for
+        points with missing coordinates)
+    """
+    dlng, dlat = _radius_degrees(latitudes, within_miles)
+    ranges = np.stack([np.floor((longitudes - dlng) / tile_degrees),
+                       np.floor((longitudes + dlng) / tile_degrees),
+                       np.floor((latitudes - dlat) / tile_degrees),
+                       np.floor((latitudes + dlat) / tile_degrees)], axis=1)
+    valid = ~np.isnan(ranges).any(axis=1)
+    ranges[~valid] = np.nan
+    tiles = set()
+    for i_min, i_max, j_min, j_max in np.unique(ranges[valid].astype(np.int64), axis=0):
+        tiles.update((i, j) for i in range(i_min, i_max + 1) for j in range(j_min, j_max + 1))
+    return sorted(tiles), ranges
+
+
+def covers(ranges: np.ndarray, tile: Tuple[int, int]) -> np.ndarray:
+    """Mask of points, given their tile ranges from `tiles_covering`,
+    that need `tile`"""
+    i, j = tile
+    return ((ranges[:, 0] <= i) & (i <= ranges[:, 1])
+            & (ranges[:, 2] <= j) & (j <= ranges[:, 3]))
+
+
+def tile_polygon(i: int, j: int, tile_degrees: float = DEFAULT_TILE_DEGREES) -> Dict:
+    """GeoJSON polygon of tile `(i, j)`"""
+    west, south = i * tile_degrees, j * tile_degrees
+    east, north = west + tile_degrees, south + tile_degrees
+    return {"type": "Polygon",
+            "coordinates": [[[west, south], [east, south], [east, north],
+                             [west, north], [west, south]]]}
+
+
+def tile_calls(tiles: Sequence[Tuple[int, int]], labels: Sequence[str] = (),
+               brands: Sequence[str] = ()) -> List[Tuple[Tuple[int, int], str, List[str]]]:
+    """`(tile, "labels" or "brands", keys)` of the `/points_of_interest`
+    calls fetching the POIs of `tiles`, one per tile (two if both labels
+    and brands are given)"""
+    return [(tile, name, list(keys)) for tile in tiles
+            for name, keys in (("labels", labels), ("brands", brands)) if keys]
+
+
+def fetch_tile(api: IggyAPI, tile: Tuple[int, int], name: str, keys: Sequence[str],
+               tile_degrees: float = DEFAULT_TILE_DEGREES, deadline: float = None) -> Dict:
+    """POST `/points_of_interest` for the `keys` POIs within a tile"""
+    options = {"method": "POST", "params": {name: ",".join(keys)}}
+    body = {"type": "Feature", "properties": {}, "geometry": tile_polygon(*tile, tile_degrees)}
+    return api.points_of_interest(options, body, deadline=deadline)
+
+
+class POIIndex():
+    """In-memory spatial index of points of interest
+
+    Answers "which POIs are within N miles of this point" for many points
+    locally, from POIs fetched once for a whole area, instead of calling
+    `/points_of_interest` for every point.
+
+    Parameters
+    ----------
+    pois : dict
+        POIs keyed on label or brand, as returned by `/points_of_interest`.
+        Every POI must have `longitude` and `latitude`; `name` is used,
+        if present, to drop POIs returned for two overlapping tiles.
+    """
+    def __init__(self, pois: Dict[str, List[Dict]]):
+        self.coordinates = {}
+        for key, items in pois.items():
+            if items and not {"longitude", "latitude"} <= items[0].keys():
+                logger.error(f"`{key}` POIs have no `longitude` and `latitude`, which are "
+                             "needed to compute distances locally; use the API instead "
+                             "of `local_pois`")
+                raise ValueError
+            unique = {(p.get("name"), p["longitude"], p["latitude"]) for p in items}
+            coords = np.array([(lng, lat) for _, lng, lat in unique], dtype=np.float64)
+            self.coordinates[key] = coords.reshape(-1, 2)
+        self._trees = {}
+
+    @classmethod
+    def from_responses(cls, calls: Sequence[Tuple], responses: Sequence[Dict]) -> "POIIndex":
+        """Index built from the responses to `tile_calls`, skipping error
+        responses"""
+        pois = {}
+        for (tile, _, keys), response in zip(calls, responses):
+            if "message" in response:
+                logger.error(f"Error API response for tile {tile}: {response['message']}")
+                continue
+            for key in keys:
+                pois.setdefault(key, []).extend(response.get(key) or [])
+        logger.info(f"Fetched POIs for {len({c[0] for c in calls})} tiles "
+                    f"in {len(calls)} requests")
+        return cls(pois)
+
+    def distances(self, key: str, longitudes: np.ndarray, latitudes: np.ndarray,
+                  within_miles: float) -> List[np.ndarray]:
+        """Sorted distances in miles, rounded like the API to two decimals,
+        of the `key` POIs within `within_miles` of each point"""
+        import shapely
+        n = len(longitudes)
+        coords = self.coordinates.get(key)
+        if coords is None or len(coords) == 0:
+            return [np.empty(0)] * n
+        if key not in self._trees:
+            self._trees[key] = shapely.STRtree(shapely.points(coords))
+        valid = np.flatnonzero(~(np.isnan(longitudes) | np.isnan(latitudes)))
+        lngs, lats = longitudes[valid], latitudes[valid]
+        dlng, dlat = _radius_degrees(lats, within_miles)
+        boxes = shapely.box(lngs - dlng, lats - dlat, lngs + dlng, lats + dlat)
+        points, pois = self._trees[key].query(boxes)
+        points = valid[points]
+        miles = haversine_m(longitudes[points], latitudes[points],
+                            coords[pois, 0], coords[pois, 1]) / METERS_PER_MILE
+        within = miles <= within_miles
+        points, miles = points[within], miles[within]
+        order = np.lexsort((miles, points))
+        counts = np.bincount(points, minlength=n)
+        return np.split(np.round(miles[order], 2), np.cumsum(counts)[:-1])
@@ -0,0 +1,178 @@
+import random
+import threading
+import time
+from email.utils import parsedate_to_datetime
+from typing import TYPE_CHECKING, Optional, Tuple
+
+if TYPE_CHECKING:
+    from iggyapi.metrics import Histogram
+
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+
+
+class RateLimiter():
+    """Client-side adaptive token-bucket rate limiter
+
+    Shared by all threads using an IggyAPI client. Each request takes
+    one token; tokens refill at `rate` per second up to `burst`. When the
+    API throttles (HTTP 429) the bucket is paused for the `Retry-After`
+    delay and the rate is cut by `decrease_factor`, then recovers by
+    `increase_step` per successful request back to the configured rate.
+    The rate is cut at most once per throttling event: further 429s are
+    ignored until the pause ends, and for at least a second (or one
+    request interval at the reduced rate, if longer), since concurrent
+    requests sent before the cut are throttled together.
+
+    Parameters
+    ----------
+    rate : float
+        Maximum sustained requests per second, matching the plan quota
+    burst : int, optional
+        Bucket capacity. Defaults to `rate` (one second of requests).
+    min_rate : float
+        Floor the adaptive rate never drops below
+    decrease_factor : float
+        Multiplier applied to the current rate on throttling
+    increase_step : float
+        Requests per second regained after each successful request
+
+    A pickled limiter is an independent copy: when a client is sent to
+    several worker processes, each enforces `rate` on its own.
+    """
+    def __init__(self, rate: float, burst: int = None, min_rate: float = 0.1,
+                 decrease_factor: float = 0.5, increase_step: float = 0.1):
+        if rate <= 0:
+            raise ValueError("`rate` must be positive")
+        self.max_rate = rate
+        self.rate = rate
+        self.burst = burst or max(1, int(rate))
+        self.min_rate = min(min_rate, rate)
+        self.decrease_factor = decrease_factor
+        self.increase_step = increase_step
+        self._tokens = float(self.burst)
+        self._last = time.monotonic()
+        self._blocked_until = 0.0
+        self._hold_until = 0.0
+        self._lock = threading.Lock()
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        del state["_lock"]
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        """Block until a request may be sent"""
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.burst, self._tokens + (now - self._last) * self.rate)
+            self._last = now
+            self._tokens -= 1
+            wait = max(self._blocked_until - now, -self._tokens / self.rate, 0.0)
+        if wait > 0:
+            time.sleep(wait)
+
+    def throttle(self, retry_after: float = None):
+        """Record a throttled (429) response"""
+        with self._lock:
+            now = time.monotonic()
+            if retry_after:
+                self._blocked_until = max(self._blocked_until, now + retry_after)
+            if now < self._hold_until:
+                return
+            self.rate = max(self.min_rate, self.rate * self.decrease_factor)
+            self._hold_until = max(self._blocked_until, now + max(1.0, 1 / self.rate))
+
+    def recover(self):
+        """Record a successful response"""
+        if self.rate < self.max_rate:
+            with self._lock:
+                self.rate = min(self.max_rate, self.rate + self.increase_step)
+
+
+class RetryPolicy():
+    """Bounded retries with exponential backoff and full jitter
+
+    Parameters
+    ----------
+    max_retries : int
+        Maximum number of retries after the first attempt
+    backoff_factor : float
+        Base delay in seconds; retry `n` (from 0) waits a random time up
+        to `backoff_factor * 2 ** n`
+    max_backoff : float
+        Cap on the computed backoff delay in seconds
+    retry_statuses : tuple of int
+        HTTP status codes that are retried
+    respect_retry_after : bool
+        Wait at least as long as the server's `Retry-After` header asks
+    """
+    def __init__(self, max_retries: int = 3, backoff_factor: float = 0.5,
+                 max_backoff: float = 30, retry_statuses: Tuple = RETRY_STATUSES,
+                 respect_retry_after: bool = True):
+        self.max_retries = max_retries
+        self.backoff_factor = backoff_factor
+        self.max_backoff = max_backoff
+        self.retry_statuses = retry_statuses
+        self.respect_retry_after = respect_retry_after
+
+    def delay(self, attempt: int, retry_after: float = None) -> float:
+        """Seconds to wait before retry number `attempt` (from 0)"""
+        delay = random.uniform(0, min(self.max_backoff,
+                                      self.backoff_factor * 2 ** attempt))
+        if self.respect_retry_after and retry_after is not None:
+            delay = max(delay, retry_after)
+        return delay
+
+
+class HedgePolicy():
+    """Hedged GET requests to cut tail latency
+
+    When a GET request has not been answered after the `quantile` of
+    its endpoint's observed latency, an identical request is sent; its
+    response is used if the first request fails or times out.
+
+    Parameters
+    ----------
+    quantile : float
+        Latency quantile after which the duplicate request is sent
+    min_delay : float
+        Lower bound in seconds on the delay before hedging
+    min_samples : int
+        Number of responses an endpoint must have had before its latency
+        quantile is trusted and its requests are hedged
+    endpoints : tuple of str, optional
+        Endpoints to hedge, e.g. `("isochrone", "clusters")`. By default
+        all GET requests are hedged.
+    """
+    def __init__(self, quantile: float = 0.95, min_delay: float = 0.01,
+                 min_samples: int = 20, endpoints: Tuple = None):
+        self.quantile = quantile
+        self.min_delay = min_delay
+        self.min_samples = min_samples
+        self.endpoints = endpoints
+
+    def delay(self, endpoint: str, latency: "Histogram") -> Optional[float]:
+        """Seconds to wait before hedging a request, or None not to hedge"""
+        if self.endpoints is not None and endpoint not in self.endpoints:
+            return None
+        if latency.count < self.min_samples:
+            return None
+        return max(self.min_delay, latency.quantile(self.quantile))
+
+
+def parse_retry_after(value: str) -> Optional[float]:
+    """Parse a `Retry-After` header (delay seconds or HTTP date)"""
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
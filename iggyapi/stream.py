@@ -0,0 +1,105 @@
+import json
+import logging
+import os
+from typing import TYPE_CHECKING, Iterator
+
+if TYPE_CHECKING:
+    import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+
+def _is_parquet(path: str) -> bool:
+    return str(path).endswith((".parquet", ".pq"))
+
+
+def read_chunks(path: str, chunksize: int, skip_rows: int = 0) -> Iterator["pd.DataFrame"]:
+    """Read a CSV or Parquet file as a sequence of DataFrame chunks
+
+    The first `skip_rows` data rows are skipped without being parsed
+    into DataFrames. Parquet input requires `pyarrow`.
+    """
+    if _is_parquet(path):
+        import pyarrow.parquet as pq
+        skipped = 0
+        for batch in pq.ParquetFile(path).iter_batches(batch_size=chunksize):
+            if skipped + batch.num_rows <= skip_rows:
+                skipped += batch.num_rows
+                continue
+            chunk = batch.to_pandas()
+            if skipped < skip_rows:
+                chunk = chunk.iloc[skip_rows - skipped:]
+                skipped = skip_rows
+            yield chunk
+    else:
+        import pandas as pd
+        skiprows = range(1, skip_rows + 1) if skip_rows else None
+        yield from pd.read_csv(path, chunksize=chunksize, skiprows=skiprows)
+
+
+class ChunkWriter():
+    """Appends enriched chunks to a CSV file or a directory of Parquet parts
+
+    CSV output is a single file with one header. Parquet output (paths
+    ending in `.parquet`) is written as a directory with one part file
+    per chunk, which can be read back with `pd.read_parquet(path)`.
+
+    Parameters
+    ----------
+    path : str
+        Output location
+    position : int
+        Resume position as returned by `position` after the last chunk
+        written, or 0 to start a new output. Anything written past it
+        (e.g. a partial chunk from a crashed run) is discarded.
+    """
+    def __init__(self, path: str, position: int = 0):
+        self.path = path
+        self.parquet = _is_parquet(path)
+        if self.parquet:
+            os.makedirs(path, exist_ok=True)
+            for name in os.listdir(path):
+                if name.startswith("part-") and int(name[5:10]) >= position:
+                    os.remove(os.path.join(path, name))
+        else:
+            mode = "r+b" if position and os.path.exists(path) else "wb"
+            with open(path, mode) as f:
+                f.truncate(position)
+        self.position = position
+
+    def write(self, chunk: "pd.DataFrame"):
+        if self.parquet:
+            chunk.to_parquet(os.path.join(self.path, f"part-{self.position:05d}.parquet"))
+            self.position += 1
+        else:
+            with open(self.path, "ab") as f:
+                chunk.to_csv(f, header=self.position == 0, index=False)
+                self.position = f.tell()
+
+
+class Checkpoint():
+    """Progress record of a chunked enrichment job, stored as JSON
+
+    Written atomically after every chunk so that an interrupted job can
+    resume from the last completed chunk.
+    """
+    def __init__(self, path: str):
+        self.path = path
+        self.rows_done = 0
+        self.output_position = 0
+        self.complete = False
+        if os.path.exists(path):
+            with open(path) as f:
+                state = json.load(f)
+            self.rows_done = state["rows_done"]
+            self.output_position = state["output_position"]
+            self.complete = state["complete"]
+            logger.info(f"Resuming from checkpoint: {self.rows_done} rows done")
+
+    def save(self):
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump({"rows_done": self.rows_done,
+                       "output_position": self.output_position,
+                       "complete": self.complete}, f)
+        os.replace(tmp_path, self.path)
@@ -21,6 +21,13 @@ setup(
         "Operating System :: OS Independent",
     ],
     test_suite="tests",
-    install_requires=['requests', 'geopandas', 'matplotlib',
-                      'Shapely', 'pandas', 'contextily'],
+    # Shapely 2 for the vectorized STRtree/points/box API used by the
+    # local POI index, geopandas 0.12.2 for GeoSeries.to_wkb with Shapely 2
+    install_requires=['requests', 'geopandas>=0.12.2', 'matplotlib',
+                      'Shapely>=2.0', 'pandas', 'contextily'],
+    extras_require={
+        'async': ['aiohttp'],
+        'dask': ['dask[dataframe]'],
+        'parquet': ['pyarrow'],
+    },
 )
@@ -0,0 +1,161 @@
+import pickle
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from unittest.mock import MagicMock
+
+import pytest
+
+import requests
+import requests_mock
+
+import iggyapi.api as api
+from iggyapi.cache import ResponseCache
+from iggyapi.ratelimit import HedgePolicy, RateLimiter, RetryPolicy
+
+test_response = {
+    "score": 4
+}
+
+amenities_object = {
+    "method": "GET",
+    "params": {
+        "latitude": 44.976469,
+        "longitude": -93.271205,
+        "within_minutes_driving": 3,
+    },
+}
+
+
+def test_session_reused_across_endpoints():
+    curr_api = api.IggyAPI("test_string", pool_size=4)
+    session = curr_api.session
+    adapter = session.get_adapter("https://api.askiggy.com/v1/")
+    assert adapter._pool_maxsize == 4
+    with requests_mock.Mocker() as m:
+        m.get("https://api.askiggy.com/v1/amenities_score", json=test_response)
+        m.get("https://api.askiggy.com/v1/lookup", json={})
+        curr_api.amenities_score(amenities_object)
+        curr_api.lookup(amenities_object)
+        assert m.call_count == 2
+    assert curr_api.session is session
+
+
+def test_timeout_passed_to_transport():
+    session = MagicMock()
+    session.get.return_value.json.return_value = test_response
+    curr_api = api.IggyAPI("test_string", session=session, timeout=(1, 5))
+    assert curr_api.amenities_score(amenities_object) == test_response
+    assert session.get.call_args.kwargs["timeout"] == (1, 5)
+
+
+def test_endpoint_timeouts_and_deadline():
+    session = MagicMock()
+    session.get.return_value.json.return_value = test_response
+    curr_api = api.IggyAPI("test_string", session=session, timeout=(1, 5),
+                           endpoint_timeouts={"amenities_score": (2, 60)})
+    curr_api.amenities_score(amenities_object)
+    assert session.get.call_args.kwargs["timeout"] == (2, 60)
+
+    curr_api.enrich("amenities_score", amenities_object, deadline=time.monotonic() + 0.5)
+    assert all(t <= 0.5 for t in session.get.call_args.kwargs["timeout"])
+
+    session.get.reset_mock()
+    with pytest.raises(requests.Timeout):
+        curr_api.enrich("amenities_score", amenities_object, deadline=time.monotonic() - 1)
+    session.get.assert_not_called()
+    assert curr_api.metrics.snapshot()["amenities_score"]["failures"] == 1
+
+
+def test_deadline_stops_retries():
+    curr_api = api.IggyAPI("test_string", retry=RetryPolicy(max_retries=3))
+    with requests_mock.Mocker() as m:
+        m.get("https://api.askiggy.com/v1/amenities_score", status_code=503,
+              headers={"Retry-After": "10"}, json={})
+        start = time.monotonic()
+        response = curr_api.enrich("amenities_score", amenities_object, deadline=start + 1)
+    assert response["status_code"] == 503
+    assert m.call_count == 1
+    assert time.monotonic() - start < 1
+
+
+def test_hedged_get_rescues_failed_request():
+    threads = []
+
+    def get(url, **kwargs):
+        threads.append(threading.current_thread())
+        if len(threads) == 1:
+            time.sleep(0.2)
+            raise requests.Timeout
+        response = MagicMock(status_code=200, content=b"{}")
+        response.json.return_value = {"score": 2}
+        return response
+
+    session = MagicMock()
+    session.get.side_effect = get
+    curr_api = api.IggyAPI("test_string", session=session, retry=RetryPolicy(max_retries=0),
+                           hedge=HedgePolicy(min_delay=0.05, min_samples=1))
+    curr_api.metrics.record_response("amenities_score", 200, 0.01)
+    assert curr_api.amenities_score(amenities_object) == {"score": 2}
+    # the request is sent by the caller, only the duplicate by the pool
+    assert threads[0] is threading.current_thread()
+    assert threads[1] is not threading.current_thread()
+    metrics = curr_api.metrics.snapshot()["amenities_score"]
+    assert metrics["hedged"] == 1
+    assert metrics["hedge_wins"] == 1
+    assert metrics["failures"] == 0
+
+    # fast requests are never duplicated
+    session.get.side_effect = None
+    session.get.return_value.status_code = 200
+    session.get.return_value.json.return_value = test_response
+    for _ in range(5):
+        curr_api.amenities_score(amenities_object)
+    time.sleep(0.1)
+    assert session.get.call_count == 7
+    assert curr_api.metrics.snapshot()["amenities_score"]["hedged"] == 1
+
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        pools = set(executor.map(lambda _: curr_api._hedge_executor(), range(32)))
+    assert len(pools) == 1
+
+    # POST requests are never duplicated
+    session.post.return_value.json.return_value = test_response
+    curr_api.enrich("amenities_score", {"method": "POST"}, {"labels": ["bars"]})
+    assert session.post.call_count == 1
+    curr_api.close()
+
+
+def test_context_manager_closes_owned_session():
+    with api.IggyAPI("test_string") as curr_api:
+        curr_api.session.close = MagicMock()
+    curr_api.session.close.assert_called_once()
+
+
+def test_close_leaves_external_session_open():
+    session = requests.Session()
+    session.close = MagicMock()
+    with api.IggyAPI("test_string", session=session):
+        pass
+    session.close.assert_not_called()
+
+
+def test_iggyapi_pickles(tmp_path):
+    cache = ResponseCache(str(tmp_path / "cache.sqlite"))
+    curr_api = api.IggyAPI("test_string", cache=cache, rate_limiter=RateLimiter(rate=5))
+    curr_api.metrics.record_response("lookup", 200, 0.1, 10)
+    cache.set("lookup", "key", {"value": 1})
+
+    copy = pickle.loads(pickle.dumps(curr_api))
+    assert copy.session is not curr_api.session
+    assert copy.headers["X-Iggy-Token"] == "test_string"
+    assert copy.cache.get("lookup", "key") == {"value": 1}
+    assert copy.rate_limiter.rate == 5
+    assert copy.metrics.snapshot() == {}
+
+    copy.metrics.record_response("lookup", 503, 0.2, 0)
+    curr_api.metrics.merge(pickle.loads(pickle.dumps(copy.metrics)))
+    merged = curr_api.metrics.snapshot()["lookup"]
+    assert merged["requests"] == 2
+    assert merged["errors"] == {"503": 1}
+    assert merged["latency"]["count"] == 2
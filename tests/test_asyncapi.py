@@ -0,0 +1,103 @@
+import asyncio
+import json
+
+import pytest
+
+from iggyapi.asyncapi import AsyncIggyAPI
+from tests.test_clusters import cluster_response
+from tests.test_isochrone import response as isochrone_response
+
+lookup_response = {
+    "population_density_per_km": {
+        "value": 1601,
+    },
+}
+
+
+class FakeResponse():
+    def __init__(self, session, payload, status=200, reason="OK"):
+        self.session = session
+        self.payload = payload
+        self.status = status
+        self.reason = reason
+        self.ok = status < 400
+
+    async def __aenter__(self):
+        self.session.in_flight += 1
+        self.session.max_seen = max(self.session.max_seen, self.session.in_flight)
+        await asyncio.sleep(0.01)
+        return self
+
+    async def __aexit__(self, *args):
+        self.session.in_flight -= 1
+
+    async def json(self, content_type="application/json"):
+        if isinstance(self.payload, str):
+            return json.loads(self.payload)
+        return self.payload
+
+
+class FakeSession():
+    def __init__(self, payload, status=200, reason="OK"):
+        self.payload = payload
+        self.status = status
+        self.reason = reason
+        self.calls = []
+        self.in_flight = 0
+        self.max_seen = 0
+
+    def get(self, url, params=None, headers=None):
+        self.calls.append(("GET", url, params))
+        return FakeResponse(self, self.payload, self.status, self.reason)
+
+    def post(self, url, params=None, data=None, headers=None):
+        self.calls.append(("POST", url, params, data))
+        return FakeResponse(self, self.payload, self.status, self.reason)
+
+
+def test_async_lookup():
+    session = FakeSession(lookup_response)
+    curr_api = AsyncIggyAPI("test_string", session=session)
+    options = {"params": {"latitude": 44.97, "longitude": -93.27,
+                          "labels": "population_density_per_km"}}
+    result = asyncio.run(curr_api.lookup(options))
+    assert result == lookup_response
+    assert session.calls[0][1] == "https://api.askiggy.com/v1/lookup"
+
+
+def test_async_bounded_concurrency():
+    session = FakeSession(lookup_response)
+    curr_api = AsyncIggyAPI("test_string", session=session, max_in_flight=3)
+
+    async def run():
+        return await asyncio.gather(
+            *[curr_api.lookup({"params": {}}) for _ in range(10)])
+
+    results = asyncio.run(run())
+    assert len(results) == 10
+    assert session.max_seen == 3
+
+
+def test_async_gdf_conversions():
+    curr_api = AsyncIggyAPI("test_string", session=FakeSession(isochrone_response))
+    gdf = asyncio.run(curr_api.isochrone({"params": {}}))
+    assert gdf.shape[0] == 1
+
+    curr_api = AsyncIggyAPI("test_string", session=FakeSession(cluster_response))
+    gdf = asyncio.run(curr_api.clusters({"params": {}}))
+    assert gdf.shape[0] == len(cluster_response["clusters"])
+
+
+def test_async_http_errors():
+    session = FakeSession("<html>Bad Gateway</html>", status=502, reason="Bad Gateway")
+    curr_api = AsyncIggyAPI("test_string", session=session)
+    result = asyncio.run(curr_api.lookup({"params": {}}))
+    assert result == {"message": "HTTP 502: Bad Gateway", "status_code": 502}
+
+    session = FakeSession({"message": "Invalid token"}, status=401, reason="Unauthorized")
+    curr_api = AsyncIggyAPI("test_string", session=session)
+    result = asyncio.run(curr_api.lookup({"params": {}}))
+    assert result == {"message": "Invalid token", "status_code": 401}
+
+    with pytest.raises(ValueError):
+        asyncio.run(curr_api.enrich("lookup", {"method": "PUT", "params": {}}))
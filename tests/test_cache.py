@@ -0,0 +1,106 @@
+import sqlite3
+import time
+
+import requests_mock
+
+import iggyapi.api as api
+from iggyapi.cache import ResponseCache
+
+test_response = {
+    "score": 4
+}
+
+err_response = {
+    "message": "Invalid location. Ensure your location is close to a road."
+}
+
+amenities_object = {
+    "method": "GET",
+    "params": {
+        "latitude": 44.976469,
+        "longitude": -93.271205,
+        "within_minutes_driving": 3,
+    },
+}
+
+
+def test_cache_survives_restart(tmp_path):
+    path = str(tmp_path / "cache.sqlite")
+    with requests_mock.Mocker() as m:
+        m.get("https://api.askiggy.com/v1/amenities_score", json=test_response)
+        curr_api = api.IggyAPI("test_string", cache=ResponseCache(path))
+        assert curr_api.amenities_score(amenities_object) == test_response
+        curr_api.cache.close()
+
+        curr_api = api.IggyAPI("test_string", cache=ResponseCache(path))
+        assert curr_api.amenities_score(amenities_object) == test_response
+        assert m.call_count == 1
+
+
+def test_cache_key_normalization():
+    key = ResponseCache.make_key("lookup", "GET", {"latitude": 44.9, "labels": "a"})
+    assert key == ResponseCache.make_key("lookup", "get", {"labels": "a", "latitude": "44.9"})
+    assert key != ResponseCache.make_key("lookup", "GET", {"latitude": 44.8, "labels": "a"})
+    assert key != ResponseCache.make_key("lookup", "POST", {"latitude": 44.9, "labels": "a"})
+
+
+def test_cache_skips_errors():
+    with requests_mock.Mocker() as m:
+        m.get("https://api.askiggy.com/v1/amenities_score", json=err_response)
+        curr_api = api.IggyAPI("test_string", cache=ResponseCache(":memory:"))
+        curr_api.amenities_score(amenities_object)
+        curr_api.amenities_score(amenities_object)
+        assert m.call_count == 2
+        assert len(curr_api.cache) == 0
+
+
+def test_cache_ttl():
+    cache = ResponseCache(":memory:", ttl=60, endpoint_ttls={"lookup": 0.01,
+                                                             "clusters": 0})
+    cache.set("lookup", "a", test_response)
+    cache.set("amenities_score", "b", test_response)
+    time.sleep(0.02)
+    assert cache.get("lookup", "a") is None
+    assert cache.get("amenities_score", "b") == test_response
+    assert not cache.enabled_for("clusters")
+
+
+def test_cache_lru_eviction():
+    cache = ResponseCache(":memory:", max_bytes=30)
+    cache.set("lookup", "a", test_response)
+    cache.set("lookup", "b", test_response)
+    cache.get("lookup", "a")
+    cache.set("lookup", "c", test_response)
+    assert cache.get("lookup", "b") is None
+    assert cache.get("lookup", "a") == test_response
+    assert cache.get("lookup", "c") == test_response
+
+
+def test_cache_tracks_total_size(tmp_path):
+    path = str(tmp_path / "cache.sqlite")
+    # a cache file written before the running total was kept
+    conn = sqlite3.connect(path)
+    conn.execute("CREATE TABLE responses (key TEXT PRIMARY KEY, endpoint TEXT NOT NULL,"
+                 " value TEXT NOT NULL, size INTEGER NOT NULL, created REAL NOT NULL,"
+                 " accessed REAL NOT NULL)")
+    conn.execute("INSERT INTO responses VALUES ('old', 'lookup', '{}', 2, 0, 0)")
+    conn.commit()
+    conn.close()
+
+    cache = ResponseCache(path, ttl=60)
+
+    def total():
+        tracked = cache._conn.execute("SELECT total FROM cache_size").fetchone()[0]
+        actual = cache._conn.execute("SELECT SUM(size) FROM responses").fetchone()[0] or 0
+        assert tracked == actual
+        return tracked
+
+    assert total() == 2
+    cache.set("lookup", "a", test_response)
+    cache.set("lookup", "a", {"score": 40})
+    cache.set("lookup", "b", test_response)
+    assert total() == 2 + len('{"score":40}') + len('{"score":4}')
+    cache._conn.execute("DELETE FROM responses WHERE key = 'b'")
+    assert total() == 2 + len('{"score":40}')
+    cache.clear()
+    assert total() == 0
@@ -1,3 +1,4 @@
+import numpy as np
 import pytest
 
 import iggyapi.api as api
@@ -69,3 +70,66 @@ def test_featurecalc_no_result():
     fc_max = FeatureCalc(result_keys=["waste_management", "straight_line_distance_miles"],
                          calc_method="max")
     assert fc_max(test_poi_response) is None
+
+
+def test_featurecalc_reads_without_copy():
+    nested = {"inner": [1, 2]}
+    fc_val = FeatureCalc(result_keys=["outer", "nested"], calc_method="value")
+    assert fc_val({"outer": {"nested": nested}}) is nested
+
+
+def test_featurecalc_recompiles_on_update():
+    fc = FeatureCalc(result_keys=["bars", "straight_line_distance_miles"],
+                     calc_method="min")
+    fc.calc_method = "count"
+    assert fc(test_poi_response) == 4
+    fc.result_keys = ["waste_management", "straight_line_distance_miles"]
+    assert fc(test_poi_response) == 0
+
+
+def test_featurecalc_mean_sum_nth():
+    keys = ["bars", "straight_line_distance_miles"]
+    assert FeatureCalc(keys, "sum")(test_poi_response) == pytest.approx(0.86)
+    assert FeatureCalc(keys, "mean")(test_poi_response) == pytest.approx(0.215)
+    assert FeatureCalc(keys, "nth", n=2)(test_poi_response) == 0.21
+    assert FeatureCalc(keys, "nth", n=5)(test_poi_response) is None
+
+
+def test_featurecalc_batch():
+    keys = ["bars", "straight_line_distance_miles"]
+    empty_response = {"bars": []}
+    err_response = {"message": "Invalid location."}
+    responses = [test_poi_response, empty_response, err_response, test_poi_response]
+
+    values, mask = FeatureCalc(keys, "count").batch(responses)
+    assert values.dtype == np.int64
+    assert list(values[~mask]) == [4, 0, 4]
+    assert list(mask) == [False, False, True, False]
+
+    expected = {
+        "min": [0.13, None, None, 0.13],
+        "max": [0.28, None, None, 0.28],
+        "sum": [0.86, 0, None, 0.86],
+        "mean": [0.215, None, None, 0.215],
+    }
+    for method, expected_values in expected.items():
+        values, mask = FeatureCalc(keys, method).batch(responses)
+        assert values.dtype == np.float64
+        assert list(mask) == [v is None for v in expected_values]
+        assert values[~mask] == pytest.approx([v for v in expected_values if v is not None])
+
+    values, mask = FeatureCalc(keys, "nth", n=3).batch(responses)
+    assert list(mask) == [False, True, True, False]
+    assert list(values[~mask]) == [0.24, 0.24]
+
+
+def test_featurecalc_batch_value():
+    responses = [test_lookup_response, {"message": "Invalid location."}]
+    values, mask = FeatureCalc(["population_density_per_km", "value"]).batch(responses)
+    assert values.dtype == np.int64
+    assert list(mask) == [False, True]
+    assert values[0] == 1601
+
+    values, mask = FeatureCalc(["label"]).batch([{"label": "urban"}, {"label": None}])
+    assert values.dtype == object
+    assert list(mask) == [False, True]
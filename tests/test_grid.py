@@ -0,0 +1,49 @@
+import numpy as np
+import pytest
+
+from iggyapi.grid import geohash_cell_size, snap_error_stats, snap_to_geohash
+
+BASE32 = "0123456789bcdefghjkmnpqrstuvwxyz"
+
+
+def geohash_encode(longitude: float, latitude: float, precision: int) -> str:
+    """Geohash string of the cell containing a point"""
+    lng_range, lat_range = [-180.0, 180.0], [-90.0, 90.0]
+    chars, bits, bit_count, even = [], 0, 0, True
+    while len(chars) < precision:
+        rng, value = (lng_range, longitude) if even else (lat_range, latitude)
+        mid = (rng[0] + rng[1]) / 2
+        bits <<= 1
+        if value >= mid:
+            bits |= 1
+            rng[0] = mid
+        else:
+            rng[1] = mid
+        even = not even
+        bit_count += 1
+        if bit_count == 5:
+            chars.append(BASE32[bits])
+            bits, bit_count = 0, 0
+    return "".join(chars)
+
+
+def test_snap_to_geohash_matches_geohash_cells():
+    lngs = np.array([-93.271205, -82.69850674919671, 0.0001, 179.9])
+    lats = np.array([44.976469, 27.73926873952831, -0.0001, -89.9])
+    for precision in (5, 7, 9):
+        width, height = geohash_cell_size(precision)
+        slngs, slats = snap_to_geohash(lngs, lats, precision)
+        assert np.all(np.abs(slngs - lngs) <= width / 2)
+        assert np.all(np.abs(slats - lats) <= height / 2)
+        for lng, lat, slng, slat in zip(lngs, lats, slngs, slats):
+            assert geohash_encode(lng, lat, precision) == geohash_encode(slng, slat, precision)
+    assert geohash_encode(-5.6, 42.6, 5) == "ezs42"
+
+
+def test_snap_error_stats():
+    lngs, lats = np.array([0.0, 0.0, np.nan]), np.array([0.0, 0.001, np.nan])
+    stats = snap_error_stats(lngs, lats, np.zeros(3), np.zeros(3), 1)
+    assert stats["points"] == 2
+    assert stats["max_m"] == pytest.approx(111.2, abs=0.1)
+    assert stats["mean_m"] == pytest.approx(55.6, abs=0.1)
+    assert snap_error_stats(lngs[2:], lats[2:], lngs[2:], lats[2:], 0)["mean_m"] is None
@@ -1,6 +1,15 @@
+import pickle
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from copy import deepcopy
+
 import geopandas as gpd
+import numpy as np
 import pandas as pd
 import pytest
+import requests
+from shapely.geometry import Point, box
 from unittest.mock import MagicMock
 
 import iggyapi.api as api
@@ -8,6 +17,7 @@ from iggyapi.iggyfeature import \
     FeatureCalc, IggyFeature, \
     IggyLookupFeature, IggyPOIFeature, \
     IggyAmenitiesScoreFeature, IggyFeatureSet
+from iggyapi.ratelimit import RetryPolicy
 
 test_latitude = 44.976469
 test_longitude = -93.271205
@@ -71,6 +81,26 @@ def test_iggyfeature_lookup_badcoords():
     assert result is None
 
 
+def test_iggyfeatureset_list_values():
+    curr_api = api.IggyAPI("test_string")
+    curr_api.enrich = MagicMock(return_value={"x": {"tags": [1, 2]}})
+    f = IggyFeature(curr_api, "x_tags", "lookup", params={"labels": "x"},
+                    calc=FeatureCalc(["x", "tags"]))
+    df_out = IggyFeatureSet([f]).enrich_dataframe(test_df, longitude_col='lng',
+                                                  latitude_col='lat', dedupe=False)
+    assert df_out["x_tags"].dtype == object
+    assert df_out["x_tags"].tolist() == [[1, 2]] * 3
+
+
+def test_iggyfeatureset_local_pois_need_coordinates():
+    curr_api = api.IggyAPI("test_string")
+    curr_api.enrich = MagicMock(return_value=test_poi_response)
+    f = IggyPOIFeature(curr_api, "count", label="bars", within_miles=1)
+    with pytest.raises(ValueError):
+        IggyFeatureSet([f]).enrich_dataframe(test_df, longitude_col='lng',
+                                             latitude_col='lat', local_pois=True)
+
+
 def test_iggylookup_popdensity():
     label = "population_density_per_km"
     curr_api = api.IggyAPI("test_string")
@@ -137,3 +167,444 @@ def test_iggyfeatureset():
     assert gdf_out.shape == (3, 5)
     assert gdf_out.lookup_population_density_per_km_value.iloc[0] == 1601
 
+
+
+def test_iggyfeatureset_concurrent_preserves_order():
+    local_api = api.IggyAPI("test_token")
+    in_flight = {"now": 0, "max": 0}
+    lock = threading.Lock()
+
+    def fake_enrich(endpoint, options, **kwargs):
+        with lock:
+            in_flight["now"] += 1
+            in_flight["max"] = max(in_flight["max"], in_flight["now"])
+        time.sleep(0.01)
+        with lock:
+            in_flight["now"] -= 1
+        return {"score": options["params"]["latitude"]}
+
+    local_api.enrich = MagicMock(side_effect=fake_enrich)
+    f = IggyAmenitiesScoreFeature(local_api, within_minutes_biking=10)
+    df = pd.DataFrame({'lat': [float(i) for i in range(20)],
+                       'lng': [0.0] * 20})
+    df_out = IggyFeatureSet([f]).enrich_dataframe(
+        df, longitude_col='lng', latitude_col='lat', max_workers=8)
+    assert list(df_out[f.name]) == list(df.lat)
+    assert in_flight["max"] > 1
+
+
+def test_iggyfeatureset_merges_lookup_features():
+    local_api = api.IggyAPI("test_token")
+    local_api.enrich = MagicMock(return_value={
+        "population_density_per_km": {"value": 1601},
+        "median_age": {"value": 34},
+        "air_quality": {"air_quality_index": 21},
+    })
+    features = [
+        IggyLookupFeature(local_api, "value", label="population_density_per_km"),
+        IggyLookupFeature(local_api, "value", label="median_age"),
+        IggyLookupFeature(local_api, "value", label="air_quality"),
+    ]
+    fs = IggyFeatureSet(features)
+    plan = fs.plan()
+    assert len(plan) == 1
+    assert plan[0].params["labels"] == "population_density_per_km,median_age,air_quality"
+
+    df_out = fs.enrich_dataframe(test_df, longitude_col='lng', latitude_col='lat')
+    assert local_api.enrich.call_count == len(test_df)
+    assert list(df_out.columns[2:]) == [f.name for f in features]
+    assert df_out.lookup_median_age_value.iloc[0] == 34
+    assert df_out.lookup_air_quality_value.iloc[0] == 21
+
+
+def test_iggyfeatureset_plan_keeps_incompatible_requests_apart():
+    api_1 = api.IggyAPI("test_token")
+    api_2 = api.IggyAPI("test_token")
+    fs = IggyFeatureSet([
+        IggyLookupFeature(api_1, "value", label="population_density_per_km"),
+        IggyLookupFeature(api_2, "value", label="median_age"),
+        IggyAmenitiesScoreFeature(api_1, within_minutes_biking=10),
+    ])
+    assert len(fs.plan()) == 3
+
+
+def test_iggyfeatureset_merges_poi_features():
+    local_api = api.IggyAPI("test_token")
+    local_api.enrich = MagicMock(return_value={
+        "bars": test_poi_response["bars"],
+        "grocery_stores": [{"name": "Lunds", "straight_line_distance_miles": 0.5}],
+    })
+    features = [
+        IggyPOIFeature(local_api, "min", label="bars", within_minutes_driving=10),
+        IggyPOIFeature(local_api, "count", label="bars", within_minutes_driving=10),
+        IggyPOIFeature(local_api, "min", label="grocery_stores", within_minutes_driving=10),
+        IggyPOIFeature(local_api, "min", label="grocery_stores", within_minutes_walking=10),
+        IggyPOIFeature(local_api, "min", brand="Starbucks", within_minutes_driving=10),
+    ]
+    plan = IggyFeatureSet(features).plan()
+    assert [len(r.features) for r in plan] == [3, 1, 1]
+    assert plan[0].params == {"labels": "bars,grocery_stores",
+                              "within_minutes_driving": 10}
+
+    request = plan[0]
+    assert request.calculate(test_longitude, test_latitude) == [0.13, 4, 0.5]
+    local_api.enrich.assert_called_once()
+
+
+def test_iggyfeatureset_dedupes_coordinates():
+    local_api = api.IggyAPI("test_token")
+    local_api.enrich = MagicMock(
+        side_effect=lambda endpoint, options, **kwargs: {"score": options["params"]["latitude"]})
+    f = IggyAmenitiesScoreFeature(local_api, within_minutes_biking=10)
+    df = pd.DataFrame({'lat': [27.1, 27.2, 27.1, 27.100001, 27.2],
+                       'lng': [-82.6, -82.6, -82.6, -82.6, -82.6]})
+    fs = IggyFeatureSet([f])
+
+    df_out = fs.enrich_dataframe(df, longitude_col='lng', latitude_col='lat')
+    assert local_api.enrich.call_count == 3
+    assert list(df_out[f.name]) == list(df.lat)
+
+    local_api.enrich.reset_mock()
+    df_out = fs.enrich_dataframe(df, longitude_col='lng', latitude_col='lat',
+                                 precision=4)
+    assert local_api.enrich.call_count == 2
+    assert list(df_out[f.name]) == [27.1, 27.2, 27.1, 27.1, 27.2]
+
+    local_api.enrich.reset_mock()
+    fs.enrich_dataframe(df, longitude_col='lng', latitude_col='lat', dedupe=False)
+    assert local_api.enrich.call_count == 5
+
+
+def test_iggyfeatureset_builds_typed_columns():
+    local_api = api.IggyAPI("test_token")
+    local_api.enrich = MagicMock(side_effect=[test_poi_response, err_response,
+                                              test_poi_response])
+    f1 = IggyPOIFeature(local_api, calc_method="count", label="bars",
+                        within_minutes_walking=5)
+    f2 = IggyPOIFeature(local_api, calc_method="nth", n=2, label="bars",
+                        within_minutes_walking=5)
+    assert f2.name == "poi_bars_nth2"
+    df_out = IggyFeatureSet([f1, f2]).enrich_dataframe(
+        test_df, longitude_col='lng', latitude_col='lat')
+    assert df_out.poi_bars_count.dtype == np.float64
+    assert df_out.poi_bars_count.isna().tolist() == [False, True, False]
+    assert df_out.poi_bars_nth2.iloc[2] == 0.21
+
+
+def test_iggyfeatureset_snaps_to_geohash_cells():
+    local_api = api.IggyAPI("test_token")
+    local_api.enrich = MagicMock(side_effect=lambda endpoint, options, **kwargs: {
+        "score": options["params"]["longitude"]} if endpoint == "amenities_score"
+        else test_lookup_response)
+    snapped = IggyAmenitiesScoreFeature(local_api, within_minutes_biking=10,
+                                        snap_precision=6)
+    exact = IggyLookupFeature(local_api, "value", label="population_density_per_km")
+    df = pd.DataFrame({'lat': [27.1, 27.1005, 27.2], 'lng': [-82.6, -82.6005, -82.6]})
+    fs = IggyFeatureSet([snapped, exact])
+    assert len(fs.plan()) == 2
+
+    df_out = fs.enrich_dataframe(df, longitude_col='lng', latitude_col='lat')
+    endpoints = [c.args[0] for c in local_api.enrich.call_args_list]
+    assert endpoints.count("amenities_score") == 2
+    assert endpoints.count("lookup") == 3
+    assert df_out[snapped.name][0] == df_out[snapped.name][1] != -82.6
+    stats = fs.snap_stats[snapped.name]
+    assert stats["points"] == 3 and stats["cells"] == 2
+    assert 0 < stats["mean_m"] <= stats["max_m"] < 700
+    assert exact.name not in fs.snap_stats
+
+
+def test_iggyfeatureset_enriches_partitioned_dataframes():
+    dd = pytest.importorskip("dask.dataframe")
+    local_api = api.IggyAPI("test_token")
+    local_api.enrich = MagicMock(side_effect=lambda endpoint, options, **kwargs: (
+        test_lookup_response if endpoint == "lookup" else test_poi_response))
+    f1 = IggyLookupFeature(local_api, "value", label="population_density_per_km")
+    f2 = IggyPOIFeature(local_api, calc_method="count", label="bars",
+                        within_minutes_walking=5)
+    fs = IggyFeatureSet([f1, f2])
+    ddf = dd.from_pandas(test_df, npartitions=2)
+
+    enriched = fs.enrich_dataframe(ddf, longitude_col='lng', latitude_col='lat',
+                                   meta={f1.name: "float64"})
+    assert local_api.enrich.call_count == 0
+    assert dict(enriched.dtypes) == {'lat': np.float64, 'lng': np.float64,
+                                     f1.name: np.float64, f2.name: np.float64}
+    df_out = enriched.compute()
+    assert local_api.enrich.call_count == 6
+    assert list(df_out[f1.name]) == [1601.0] * 3
+    assert list(df_out[f2.name]) == [4.0] * 3
+    assert len(enriched[enriched.lat > 90].compute()) == 0
+
+
+def _load_twice(payload):
+    first, second = pickle.loads(payload), pickle.loads(payload)
+    return first is second, first.features[0].api is second.features[0].api
+
+
+def test_iggyfeatureset_shares_clients_per_worker():
+    fs = IggyFeatureSet([IggyAmenitiesScoreFeature(api.IggyAPI("test_token"),
+                                                   within_minutes_biking=10)])
+    fs.snap_stats = {"feature": {}}
+    payload = pickle.dumps(fs)
+    first, second = pickle.loads(payload), pickle.loads(payload)
+    assert first is not second and first is not fs
+    assert first.features[0].api is not second.features[0].api
+    assert first.features[0].api.session is not fs.features[0].api.session
+    assert first.snap_stats == {}
+    assert deepcopy(fs) is not deepcopy(fs)
+
+    # in a worker process, copies are distinct but share the clients
+    with ProcessPoolExecutor(max_workers=1) as executor:
+        assert executor.submit(_load_twice, payload).result() == (False, True)
+
+
+def test_iggyfeatureset_enriches_inplace():
+    local_api = api.IggyAPI("test_token")
+    local_api.enrich = MagicMock(return_value=test_poi_response)
+    f = IggyPOIFeature(local_api, calc_method="count", label="bars", within_minutes_walking=5)
+    df = test_df.copy()
+    assert IggyFeatureSet([f]).enrich_dataframe(
+        df, longitude_col='lng', latitude_col='lat', inplace=True) is None
+    assert list(df.columns) == ['lat', 'lng', f.name]
+    assert list(df[f.name]) == [4, 4, 4]
+
+
+def test_iggyfeatureset_updates_changed_rows_and_features():
+    local_api = api.IggyAPI("test_token")
+    local_api.enrich = MagicMock(side_effect=lambda endpoint, options, **kwargs: {
+        "score": options["params"]["latitude"]})
+    f1 = IggyAmenitiesScoreFeature(local_api, within_minutes_biking=10)
+    f2 = IggyAmenitiesScoreFeature(local_api, within_minutes_walking=10)
+    fs = IggyFeatureSet([f1, f2])
+    previous = fs.enrich_dataframe(test_df, longitude_col='lng', latitude_col='lat')
+    assert previous.attrs["iggy_fingerprints"] == fs.fingerprints()
+
+    # one row moved, one row added, one row removed
+    df = pd.DataFrame({'lat': [27.73926873952831, 27.5, 27.6],
+                       'lng': [-82.69850674919671, -82.69463063223678, -82.6]},
+                      index=[0, 1, 3])
+    local_api.enrich.reset_mock()
+    updated = fs.update_dataframe(df, previous, longitude_col='lng', latitude_col='lat')
+    assert local_api.enrich.call_count == 4
+    assert list(updated.index) == [0, 1, 3]
+    assert list(updated[f1.name]) == list(updated[f2.name]) == list(df.lat)
+
+    # a changed definition is recomputed for every row, other columns are kept
+    f2.params["within_minutes_walking"] = 15
+    local_api.enrich.reset_mock()
+    updated = fs.update_dataframe(df, updated, longitude_col='lng', latitude_col='lat')
+    assert local_api.enrich.call_count == 3
+    assert all(c.args[1]["params"]["within_minutes_walking"] == 15
+               for c in local_api.enrich.call_args_list)
+    assert updated.attrs["iggy_fingerprints"][f2.name] == f2.fingerprint
+
+    local_api.enrich.reset_mock()
+    fs.update_dataframe(df, updated, longitude_col='lng', latitude_col='lat')
+    assert local_api.enrich.call_count == 0
+
+
+def test_iggyfeatureset_skips_missing_coordinates():
+    local_api = api.IggyAPI("test_token")
+    local_api.enrich = MagicMock(side_effect=lambda endpoint, options, **kwargs: {
+        "score": options["params"]["latitude"]})
+    fs = IggyFeatureSet([IggyAmenitiesScoreFeature(local_api, within_minutes_biking=10)])
+    df = pd.DataFrame({'lat': [27.5, np.nan, 27.6, 27.5], 'lng': [-82.6, -82.6, np.nan, -82.6]},
+                      index=[10, 11, 12, 13])
+    for dedupe, calls in ((True, 1), (False, 2)):
+        local_api.enrich.reset_mock()
+        df_out = fs.enrich_dataframe(df, longitude_col='lng', latitude_col='lat',
+                                     dedupe=dedupe)
+        assert local_api.enrich.call_count == calls
+        assert df_out[fs.features[0].name].tolist()[::3] == [27.5, 27.5]
+        assert df_out[fs.features[0].name].loc[[11, 12]].isna().all()
+        assert fs.failures.row.tolist() == [11, 12]
+        assert set(fs.failures.message) == {"Missing coordinates"}
+        assert fs.failures.attempts.tolist() == [0, 0]
+
+
+def test_iggyfeatureset_update_and_retry_reject_inplace():
+    local_api = api.IggyAPI("test_token")
+    local_api.enrich = MagicMock(return_value={"score": 1})
+    fs = IggyFeatureSet([IggyAmenitiesScoreFeature(local_api, within_minutes_biking=10)])
+    previous = fs.enrich_dataframe(test_df, longitude_col='lng', latitude_col='lat')
+    local_api.enrich.reset_mock()
+    for kwargs in ({"inplace": True}, {"meta": {}}):
+        with pytest.raises(ValueError):
+            fs.update_dataframe(test_df, previous, longitude_col='lng', latitude_col='lat',
+                                **kwargs)
+        with pytest.raises(ValueError):
+            fs.retry_failures(previous, longitude_col='lng', latitude_col='lat', **kwargs)
+    assert local_api.enrich.call_count == 0
+
+
+def test_iggyfeatureset_records_and_retries_failures(monkeypatch):
+    sleeps = []
+    monkeypatch.setattr(time, "sleep", sleeps.append)
+    unavailable = {"message": "HTTP 503: Service Unavailable", "status_code": 503}
+    local_api = api.IggyAPI("test_token")
+    f1 = IggyLookupFeature(local_api, "value", label="population_density_per_km")
+    f2 = IggyAmenitiesScoreFeature(local_api, within_minutes_biking=10)
+    fs = IggyFeatureSet([f1, f2])
+
+    # row 0 recovers in the deferred queue, row 1 keeps failing
+    local_api.enrich = MagicMock(side_effect=[
+        unavailable, unavailable, test_lookup_response,                  # lookup
+        {"score": 1}, err_response, requests.ConnectionError("reset"),   # amenities
+        test_lookup_response, unavailable, {"score": 3},                 # 1st retry round
+        unavailable,                                                     # 2nd retry round
+    ])
+    df_out = fs.enrich_dataframe(test_df, longitude_col='lng', latitude_col='lat',
+                                 retry_failed=RetryPolicy(max_retries=2, backoff_factor=1))
+    assert len(sleeps) == 2
+    assert df_out[f1.name].isna().tolist() == [False, True, False]
+    assert df_out[f2.name].tolist()[::2] == [1, 3] and np.isnan(df_out[f2.name][1])
+    assert fs.failures[["row", "feature", "attempts"]].values.tolist() == [
+        [1, f1.name, 3], [1, f2.name, 1]]
+    assert fs.failures.status[0] == 503 and fs.failures.status.isna()[1]
+    assert fs.failures.message.tolist() == ["HTTP 503: Service Unavailable",
+                                            err_response["message"]]
+
+    local_api.enrich = MagicMock(side_effect=[test_lookup_response, {"score": 2}])
+    retried = fs.retry_failures(df_out, longitude_col='lng', latitude_col='lat')
+    assert retried[f1.name].tolist() == [1601, 1601, 1601]
+    assert retried[f2.name].tolist() == [1, 2, 3]
+    assert len(fs.failures) == 0
+
+
+def test_iggyfeatureset_iter_enrich_streams_rows():
+    local_api = api.IggyAPI("test_token")
+
+    def fake_enrich(endpoint, options, **kwargs):
+        latitude = options["params"]["latitude"]
+        time.sleep(0.1 if latitude == 0 and endpoint == "amenities_score" else 0.001)
+        if endpoint == "lookup":
+            return test_lookup_response
+        return {"score": latitude}
+
+    local_api.enrich = MagicMock(side_effect=fake_enrich)
+    f1 = IggyAmenitiesScoreFeature(local_api, within_minutes_biking=10)
+    f2 = IggyLookupFeature(local_api, "value", label="population_density_per_km")
+    read = []
+
+    def rows():
+        for i in range(10):
+            read.append(i)
+            yield i, 0.0, float(i)
+
+    stream = IggyFeatureSet([f1, f2]).iter_enrich(rows(), max_workers=2, max_in_flight=3)
+    first = next(stream)
+    assert first == {"id": 1, "longitude": 0.0, "latitude": 1.0,
+                     f1.name: 1.0, f2.name: 1601}
+    assert len(read) <= 4
+    records = [first] + list(stream)
+    assert sorted(r["id"] for r in records) == list(range(10))
+    assert all(r[f1.name] == r["latitude"] for r in records)
+    assert records[-1]["id"] == 0
+
+    stream = IggyFeatureSet([f1]).iter_enrich(((i, 0.0, 1.0) for i in range(1000)),
+                                              max_workers=2)
+    next(stream)
+    stream.close()
+    assert local_api.enrich.call_count < 40
+
+
+def test_iggyfeatureset_call_and_row_timeouts():
+    local_api = api.IggyAPI("test_token")
+    deadlines = []
+
+    def fake_enrich(endpoint, options, body={}, deadline=None):
+        deadlines.append(deadline - time.monotonic())
+        if options["params"]["latitude"] == 1:
+            raise requests.Timeout(f"Deadline exceeded for /{endpoint}")
+        return {"score": options["params"]["latitude"]}
+
+    local_api.enrich = MagicMock(side_effect=fake_enrich)
+    fs = IggyFeatureSet([IggyAmenitiesScoreFeature(local_api, within_minutes_biking=10)])
+    df = pd.DataFrame({'lat': [0.0, 1.0, 2.0], 'lng': [0.0, 0.0, 0.0]})
+    df_out = fs.enrich_dataframe(df, longitude_col='lng', latitude_col='lat',
+                                 max_workers=2, call_timeout=5)
+    assert df_out[fs.features[0].name].tolist()[::2] == [0.0, 2.0]
+    assert np.isnan(df_out[fs.features[0].name][1])
+    assert fs.failures.row.tolist() == [1]
+    assert fs.failures.message[0].startswith("Timeout")
+    assert all(0 < d <= 5 for d in deadlines)
+
+    records = list(fs.iter_enrich([(i, 0.0, float(i)) for i in range(3)], row_timeout=5))
+    assert {r["id"]: r[fs.features[0].name] for r in records} == {0: 0.0, 1: None, 2: 2.0}
+
+
+def test_iggyfeatureset_enriches_polygons():
+    curr_api = api.IggyAPI("test_string")
+    curr_api.enrich = MagicMock(return_value=dict(test_poi_response, coffee_shops=[]))
+    bars = IggyPOIFeature(curr_api, "count", label="bars", within_miles=1)
+    cafes = IggyPOIFeature(curr_api, "count", label="coffee_shops", within_miles=1)
+    parcels = [box(0, 0, 1, 1), box(1, 1, 2, 2), None, box(0, 0, 1, 1)]
+    gdf = gpd.GeoDataFrame({"id": [1, 2, 3, 4]}, geometry=parcels, index=[10, 11, 12, 13])
+    fs = IggyFeatureSet([bars, cafes])
+    df_out = fs.enrich_dataframe(gdf)
+    # one POST per unique polygon, with the labels merged
+    assert curr_api.enrich.call_count == 2
+    endpoint, options, body = curr_api.enrich.call_args_list[0].args
+    assert endpoint == "points_of_interest"
+    assert options == {"method": "POST", "params": {"labels": "bars,coffee_shops"}}
+    assert body == {"type": "Feature", "properties": {}, "geometry": parcels[0].__geo_interface__}
+    assert df_out[bars.name].tolist()[:2] == [4, 4] and df_out[bars.name][13] == 4
+    assert df_out[bars.name].isna().tolist() == [False, False, True, False]
+    assert fs.failures.row.tolist() == [12, 12]
+    assert set(fs.failures.message) == {"Missing geometry"}
+
+    curr_api.enrich.reset_mock()
+    df_out = fs.enrich_dataframe(gdf, dedupe=False)
+    assert curr_api.enrich.call_count == 3
+    assert df_out[cafes.name].isna().tolist() == [False, False, True, False]
+
+
+def test_iggyfeatureset_polygons_need_count_features():
+    curr_api = api.IggyAPI("test_string")
+    curr_api.enrich = MagicMock(return_value=test_poi_response)
+    gdf = gpd.GeoDataFrame({"id": [1]}, geometry=[box(0, 0, 1, 1)])
+    for feature in (IggyPOIFeature(curr_api, "min", label="bars", within_miles=1),
+                    IggyLookupFeature(curr_api, "value", label="population_density_per_km")):
+        with pytest.raises(ValueError):
+            IggyFeatureSet([feature]).enrich_dataframe(gdf)
+    assert curr_api.enrich.call_count == 0
+
+
+def test_iggyfeatureset_rejects_mixed_geometries():
+    curr_api = api.IggyAPI("test_string")
+    curr_api.enrich = MagicMock(return_value=test_poi_response)
+    gdf = gpd.GeoDataFrame({"id": [1, 2]}, geometry=[box(0, 0, 1, 1), Point(0, 0)])
+    fs = IggyFeatureSet([IggyPOIFeature(curr_api, "count", label="bars", within_miles=1)])
+    with pytest.raises(ValueError):
+        fs.enrich_dataframe(gdf)
+    assert curr_api.enrich.call_count == 0
+
+
+def test_iggyfeatureset_local_pois():
+    # bars 0 and ~0.5 miles north of the first point
+    bars = {"bars": [{"name": "A", "longitude": test_df.lng[0], "latitude": test_df.lat[0]},
+                     {"name": "B", "longitude": test_df.lng[0],
+                      "latitude": test_df.lat[0] + 0.00724}]}
+    curr_api = api.IggyAPI("test_string")
+    curr_api.enrich = MagicMock(side_effect=lambda endpoint, options, *args, **kwargs:
+                                bars if endpoint == "points_of_interest" else {"score": 1})
+    count = IggyPOIFeature(curr_api, "count", label="bars", within_miles=1)
+    nearest = IggyPOIFeature(curr_api, "min", label="bars", within_miles=1)
+    amenities = IggyAmenitiesScoreFeature(curr_api, within_minutes_biking=10)
+    df = pd.concat([test_df, pd.DataFrame({'lat': [np.nan], 'lng': [-82.7]})],
+                   ignore_index=True)
+    fs = IggyFeatureSet([count, nearest, amenities])
+    df_out = fs.enrich_dataframe(df, longitude_col='lng', latitude_col='lat',
+                                 local_pois=True, tile_degrees=1)
+    poi_calls = [c for c in curr_api.enrich.call_args_list if c.args[0] == "points_of_interest"]
+    # both POI features are served by a single tile request
+    assert len(poi_calls) == 1
+    assert poi_calls[0].args[1] == {"method": "POST", "params": {"labels": "bars"}}
+    assert df_out[count.name].tolist()[:3] == [2, 0, 0]
+    assert df_out[nearest.name][0] == 0
+    assert df_out[count.name].isna().tolist() == [False, False, False, True]
+    # travel-time radii still go through the API, once per valid point
+    assert curr_api.enrich.call_count == 1 + 3
+    assert fs.failures.row.tolist() == [3, 3, 3]
+
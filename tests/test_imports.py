@@ -0,0 +1,44 @@
+import subprocess
+import sys
+
+LAZY_MODULES = ["geopandas", "shapely", "pandas", "matplotlib", "contextily"]
+
+
+def imported_modules(statement: str) -> set:
+    code = f"import sys; {statement}; print(' '.join(sys.modules))"
+    out = subprocess.run([sys.executable, "-c", code], check=True,
+                         capture_output=True, text=True).stdout
+    return {m.split('.')[0] for m in out.split()}
+
+
+def test_api_import_is_lazy():
+    modules = imported_modules("import iggyapi.api")
+    assert not modules.intersection(LAZY_MODULES)
+
+
+def test_iggyfeature_import_is_lazy():
+    # feature sets always work on pandas frames, so only pandas is imported eagerly
+    modules = imported_modules("import iggyapi.iggyfeature")
+    assert "pandas" in modules
+    assert not modules.intersection(set(LAZY_MODULES) - {"pandas"})
+
+
+def test_geopandas_loaded_on_use():
+    modules = imported_modules(
+        "import iggyapi.api as api; "
+        "api.isochrone_to_gdf({'type': 'Feature', 'properties': {}, "
+        "'geometry': {'type': 'Point', 'coordinates': [0, 0]}})")
+    assert "geopandas" in modules
+    assert "matplotlib" not in modules
+
+
+def test_pandas_enrichment_does_not_load_geopandas():
+    modules = imported_modules(
+        "import pandas as pd; "
+        "from unittest.mock import MagicMock; "
+        "import iggyapi.api as api; "
+        "from iggyapi.iggyfeature import IggyAmenitiesScoreFeature, IggyFeatureSet; "
+        "a = api.IggyAPI('t'); a.enrich = MagicMock(return_value={'score': 1}); "
+        "IggyFeatureSet([IggyAmenitiesScoreFeature(a, within_minutes_biking=10)])"
+        ".enrich_dataframe(pd.DataFrame({'lat': [1.0], 'lng': [2.0]}), 'lng', 'lat')")
+    assert not modules.intersection(["geopandas", "shapely"])
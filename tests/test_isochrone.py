@@ -1,6 +1,9 @@
-import iggyapi.api as api
+import requests
 import requests_mock
 
+import iggyapi.api as api
+from iggyapi.ratelimit import RetryPolicy
+
 curr_api = api.IggyAPI("test_string")
 
 
@@ -61,3 +64,42 @@ def test_isochrone_gdf():
         m.get("https://api.askiggy.com/v1/isochrone?lat=44.976469&lng=-93.271205&time_limit_minutes=1&mode=car", json=response)
         gdf = curr_api.isochrone(isochrone_object)
         assert gdf.shape[0] == 1
+
+
+def test_isochrones_batch():
+    local_api = api.IggyAPI("test_string")
+    with requests_mock.Mocker() as m:
+        m.get("https://api.askiggy.com/v1/isochrone", [
+            {"json": response},
+            {"json": {"message": "Invalid location."}, "status_code": 400},
+            {"json": response},
+        ])
+        gdf = local_api.isochrones([(-93.27, 44.97), (0.0, 0.0), (-93.26, 44.98)],
+                                   mode="driving", minutes=10,
+                                   ids=["a", "b", "c"], max_workers=1)
+        assert m.request_history[0].qs["within_minutes_driving"] == ["10"]
+    assert list(gdf.origin_id) == ["a", "b", "c"]
+    assert list(gdf.geometry.isna()) == [False, True, False]
+    assert gdf.crs.to_epsg() == 4326
+    assert local_api.last_isochrone is None
+
+
+def test_isochrones_batch_survives_connection_errors():
+    local_api = api.IggyAPI("test_string", retry=RetryPolicy(max_retries=0))
+    with requests_mock.Mocker() as m:
+        m.get("https://api.askiggy.com/v1/isochrone", [
+            {"json": response},
+            {"exc": requests.ConnectionError},
+            {"json": response},
+        ])
+        gdf = local_api.isochrones([(-93.27, 44.97), (0.0, 0.0), (-93.26, 44.98)],
+                                   mode="driving", minutes=10, max_workers=1)
+    assert list(gdf.origin_id) == [0, 1, 2]
+    assert list(gdf.geometry.isna()) == [False, True, False]
+
+
+def test_isochrones_empty():
+    gdf = curr_api.isochrones([], mode="walking", minutes=5)
+    assert gdf.shape[0] == 0
+    assert "origin_id" in gdf.columns
+    assert gdf.crs.to_epsg() == 4326
@@ -0,0 +1,95 @@
+import pytest
+import requests_mock
+
+import iggyapi.api as api
+from iggyapi.cache import ResponseCache
+from iggyapi.metrics import Histogram, Metrics
+from iggyapi.ratelimit import RetryPolicy
+
+test_response = {
+    "score": 4
+}
+
+amenities_object = {
+    "method": "GET",
+    "params": {
+        "latitude": 44.976469,
+        "longitude": -93.271205,
+        "within_minutes_driving": 3,
+    },
+}
+
+url = "https://api.askiggy.com/v1/amenities_score"
+
+
+def test_histogram_quantiles():
+    h = Histogram(buckets=(0.1, 0.2, 0.4))
+    for v in [0.05] * 50 + [0.15] * 45 + [0.3] * 5:
+        h.observe(v)
+    assert h.count == 100
+    assert h.quantile(0.5) == pytest.approx(0.1)
+    assert 0.1 < h.quantile(0.9) < 0.2
+    assert 0.2 < h.quantile(0.99) <= 0.4
+    assert Histogram().quantile(0.5) is None
+
+
+def test_latency_is_a_copy():
+    metrics = Metrics()
+    metrics.record_response("lookup", 200, 0.05)
+    latency = metrics.latency("lookup")
+    metrics.record_response("lookup", 200, 0.05)
+    assert latency.count == 1
+    assert metrics.latency("lookup").count == 2
+
+
+def test_request_metrics_and_hooks():
+    curr_api = api.IggyAPI("test_string", cache=ResponseCache(":memory:"),
+                           retry=RetryPolicy(backoff_factor=0))
+    events = []
+    curr_api.add_hook("pre_request", lambda **kw: events.append(("pre", kw["attempt"])))
+    curr_api.add_hook("post_response",
+                      lambda **kw: events.append(("post", kw["status_code"],
+                                                  kw["response_bytes"])))
+    with requests_mock.Mocker() as m:
+        m.get(url, [{"status_code": 503, "text": ""}, {"json": test_response}])
+        curr_api.amenities_score(amenities_object)
+        curr_api.amenities_score(amenities_object)
+
+    assert events == [("pre", 0), ("post", 503, 0), ("pre", 1), ("post", 200, 12)]
+    metrics = curr_api.metrics.snapshot()["amenities_score"]
+    assert metrics["requests"] == 2
+    assert metrics["retries"] == 1
+    assert metrics["errors"] == {"503": 1}
+    assert metrics["response_bytes"] == 12
+    assert metrics["cache_hits"] == 1
+    assert metrics["cache_misses"] == 1
+    assert metrics["latency"]["count"] == 2
+
+
+def test_hook_errors_are_ignored():
+    curr_api = api.IggyAPI("test_string")
+
+    def bad_hook(**kwargs):
+        raise RuntimeError
+
+    curr_api.add_hook("pre_request", bad_hook)
+    with requests_mock.Mocker() as m:
+        m.get(url, json=test_response)
+        assert curr_api.amenities_score(amenities_object) == test_response
+    with pytest.raises(ValueError):
+        curr_api.add_hook("on_error", bad_hook)
+
+
+def test_prometheus_export():
+    metrics = Metrics(buckets=(0.1, 1.0))
+    metrics.record_response("lookup", 200, 0.05, 100)
+    metrics.record_response("lookup", 429, 0.5, 20)
+    metrics.increment("lookup", "retries")
+    text = metrics.to_prometheus()
+    assert 'iggy_requests_total{endpoint="lookup"} 2' in text
+    assert 'iggy_response_bytes_total{endpoint="lookup"} 120' in text
+    assert 'iggy_retries_total{endpoint="lookup"} 1' in text
+    assert 'iggy_errors_total{endpoint="lookup",status="429"} 1' in text
+    assert 'iggy_request_latency_seconds_bucket{endpoint="lookup",le="0.1"} 1' in text
+    assert 'iggy_request_latency_seconds_bucket{endpoint="lookup",le="+Inf"} 2' in text
+    assert 'iggy_request_latency_seconds_count{endpoint="lookup"} 2' in text
@@ -0,0 +1,189 @@
+import time
+
+import geopandas as gpd
+import numpy as np
+import pandas as pd
+import pytest
+
+import iggyapi.api as api
+from iggyapi.iggyfeature import \
+    IggyLookupFeature, IggyPOIFeature, IggyFeatureSet, _enrich_partition
+from iggyapi.cache import ResponseCache
+from iggyapi.mockserver import MockIggyServer
+from iggyapi.ratelimit import RetryPolicy
+
+params = {
+    "latitude": 44.976469,
+    "longitude": -93.271205,
+}
+
+
+@pytest.fixture(scope="module")
+def server():
+    with MockIggyServer() as server:
+        yield server
+
+
+def test_mockserver_endpoints(server):
+    curr_api = api.IggyAPI("test_string", base_url=server.base_url)
+    lookup = curr_api.lookup({"params": dict(params, labels="population_density_per_km,air_quality")})
+    assert set(lookup) == {"population_density_per_km", "air_quality"}
+    assert "air_quality_index" in lookup["air_quality"]
+
+    poi = curr_api.points_of_interest(
+        {"params": dict(params, labels="bars", within_minutes_walking=20)})
+    distances = [p["straight_line_distance_miles"] for p in poi["bars"]]
+    assert distances == sorted(distances)
+    assert all(d <= 1 for d in distances)
+
+    score = curr_api.amenities_score({"params": dict(params, within_minutes_driving=10)})
+    assert 0 <= score["score"] <= 1
+    assert curr_api.isochrone({"params": dict(params, within_miles=1)}).shape[0] == 1
+    assert "clusters" in curr_api.clusters(
+        {"params": dict(params, category="bars", within_miles=1)}, raw_response=True)
+    assert "labels" in curr_api.points_of_interest_options()
+
+
+def test_mockserver_is_deterministic(server):
+    curr_api = api.IggyAPI("test_string", base_url=server.base_url)
+    options = {"params": dict(params, labels="coffee_shops", within_miles=1)}
+    assert curr_api.points_of_interest(options) == curr_api.points_of_interest(options)
+
+
+def test_mockserver_errors_are_retried():
+    with MockIggyServer(error_rate=1.0, seed=1) as server:
+        curr_api = api.IggyAPI("test_string", base_url=server.base_url,
+                               retry=RetryPolicy(max_retries=2, backoff_factor=0))
+        result = curr_api.lookup({"params": dict(params, labels="median_age")})
+        assert result["status_code"] in (429, 503)
+        assert server.request_count == 3
+
+
+def test_mockserver_enrich_dataframe(server):
+    curr_api = api.IggyAPI("test_string", base_url=server.base_url)
+    fs = IggyFeatureSet([
+        IggyLookupFeature(curr_api, "value", label="population_density_per_km"),
+        IggyPOIFeature(curr_api, "count", label="bars", within_miles=1),
+    ])
+    df = pd.DataFrame({'lat': [44.97, 44.98, 44.97], 'lng': [-93.27, -93.26, -93.27]})
+    before = server.request_count
+    df_out = fs.enrich_dataframe(df, longitude_col='lng', latitude_col='lat', max_workers=4)
+    assert server.request_count - before == 4
+    assert df_out.isna().sum().sum() == 0
+
+
+def test_benchmarks_run():
+    from benchmarks.enrichment import run_benchmarks
+    results = run_benchmarks(rows=5, workers=[2], latency=0, trace_memory=False)
+    assert [r["benchmark"] for r in results] == ["client", "enrich_dataframe"]
+    assert all(r["rows_per_sec"] > 0 for r in results)
+
+
+def test_mockserver_enrich_dataframe_processes(server, tmp_path):
+    curr_api = api.IggyAPI("test_string", base_url=server.base_url,
+                           cache=ResponseCache(str(tmp_path / "cache.sqlite")))
+    fs = IggyFeatureSet([
+        IggyLookupFeature(curr_api, "value", label="population_density_per_km"),
+        IggyPOIFeature(curr_api, "count", label="bars", within_miles=1),
+    ])
+    df = pd.DataFrame({'lat': [44.97, 44.98, 44.97, 44.99, 44.98, 44.96],
+                       'lng': [-93.27, -93.26, -93.27, -93.25, -93.26, -93.24]})
+    before = server.request_count
+    df_out = fs.enrich_dataframe(df, longitude_col='lng', latitude_col='lat',
+                                 processes=3, max_workers=2)
+    assert list(df_out.index) == list(df.index)
+    metrics = curr_api.metrics.snapshot()
+    assert metrics["lookup"]["requests"] + metrics["points_of_interest"]["requests"] \
+        == server.request_count - before
+    assert len(curr_api.cache) == 8
+
+    # every worker reads responses written by the others through the shared cache
+    before = server.request_count
+    df_again = fs.enrich_dataframe(df, longitude_col='lng', latitude_col='lat', processes=2)
+    assert server.request_count == before
+    pd.testing.assert_frame_equal(df_out, df_again)
+
+
+def test_mockserver_local_pois_match_api(server):
+    curr_api = api.IggyAPI("test_string", base_url=server.base_url)
+    fs = IggyFeatureSet([
+        IggyPOIFeature(curr_api, "count", label="bars", within_miles=1),
+        IggyPOIFeature(curr_api, "min", label="bars", within_miles=1),
+        IggyPOIFeature(curr_api, "nth", n=2, brand="Starbucks", within_miles=2),
+    ])
+    df = pd.DataFrame({'lat': [44.97, 44.98, 44.995, 45.01], 'lng': [-93.27, -93.26, -93.2, -93.31]})
+    expected = fs.enrich_dataframe(df, longitude_col='lng', latitude_col='lat')
+    before = server.request_count
+    df_out = fs.enrich_dataframe(df, longitude_col='lng', latitude_col='lat', local_pois=True,
+                                 tile_degrees=0.1)
+    assert server.request_count - before == 2 * 6
+    pd.testing.assert_frame_equal(df_out, expected)
+
+
+def test_mockserver_enrich_polygons(server):
+    from shapely.geometry import box
+    curr_api = api.IggyAPI("test_string", base_url=server.base_url)
+    bars = IggyPOIFeature(curr_api, "count", label="bars", within_miles=1)
+    cafes = IggyPOIFeature(curr_api, "count", label="coffee_shops", within_miles=1)
+    starbucks = IggyPOIFeature(curr_api, "count", brand="Starbucks", within_miles=1)
+    parcels = [box(-93.28, 44.97, -93.25, 44.99), box(-93.2, 44.9, -93.1, 45.0), None,
+               box(-93.28, 44.97, -93.25, 44.99)]
+    gdf = gpd.GeoDataFrame({"id": [1, 2, 3, 4]}, geometry=parcels, crs="epsg:4326")
+
+    before = server.request_count
+    fs = IggyFeatureSet([bars, cafes, starbucks])
+    fs.snap_stats = {bars.name: {"points": 1}}
+    df_out = fs.enrich_dataframe(gdf, max_workers=4)
+    assert fs.snap_stats == {}
+    assert server.request_count - before == 2 * 2
+    for parcel, count in zip(parcels, df_out[bars.name]):
+        if parcel is None:
+            assert np.isnan(count)
+        else:
+            options = {"method": "POST", "params": {"labels": "bars"}}
+            body = {"type": "Feature", "properties": {}, "geometry": parcel.__geo_interface__}
+            assert count == len(curr_api.points_of_interest(options, body)["bars"])
+    assert df_out[bars.name][1] > 0
+    # the mock server only accepts the documented request format
+    undocumented = {"labels": ["bars"], "geojson": parcels[0].__geo_interface__}
+    assert curr_api.points_of_interest({"method": "POST"}, undocumented)["status_code"] == 400
+    assert df_out[starbucks.name].notna().sum() == 3
+
+    with pytest.raises(ValueError):
+        IggyFeatureSet([IggyPOIFeature(curr_api, "min", label="bars", within_miles=1)]) \
+            .enrich_dataframe(gdf)
+
+
+def test_mockserver_local_pois_record_failed_tiles(monkeypatch):
+    monkeypatch.setattr(time, "sleep", lambda seconds: None)
+    df = pd.DataFrame({'lat': [44.97, 44.98, np.nan], 'lng': [-93.27, -93.26, -93.27]},
+                      index=[10, 11, 12])
+    with MockIggyServer(error_rate=1.0, seed=1) as server:
+        curr_api = api.IggyAPI("test_string", base_url=server.base_url,
+                               retry=RetryPolicy(max_retries=0))
+        fs = IggyFeatureSet([IggyPOIFeature(curr_api, "count", label="bars", within_miles=1)])
+        df_out = fs.enrich_dataframe(df, longitude_col='lng', latitude_col='lat',
+                                     local_pois=True, retry_failed=RetryPolicy(max_retries=1))
+    assert df_out[fs.features[0].name].isna().all()
+    assert fs.failures.row.tolist() == [10, 11, 12]
+    assert fs.failures.status[:2].isin([429, 503]).all()
+    assert fs.failures.attempts.tolist() == [2, 2, 0]
+
+    # a refused connection fails the rows instead of aborting the run
+    refused = api.IggyAPI("test_string", base_url="http://127.0.0.1:9/v1/",
+                          retry=RetryPolicy(max_retries=0))
+    fs = IggyFeatureSet([IggyPOIFeature(refused, "count", label="bars", within_miles=1)])
+    df_out = fs.enrich_dataframe(df, longitude_col='lng', latitude_col='lat', local_pois=True)
+    assert df_out[fs.features[0].name].isna().all()
+    assert fs.failures.message[0].startswith("ConnectionError")
+
+
+def test_mockserver_partition_metrics_are_not_double_counted(server):
+    curr_api = api.IggyAPI("test_string", base_url=server.base_url)
+    fs = IggyFeatureSet([IggyLookupFeature(curr_api, "value", label="median_age")])
+    df = pd.DataFrame({'lat': [44.97, 44.98], 'lng': [-93.27, -93.26]})
+    # one worker running both partitions with the same clients
+    results = [_enrich_partition(fs, df.iloc[[i]], 'lng', 'lat', {}) for i in range(2)]
+    assert [metrics[0].snapshot()["lookup"]["requests"] for _, _, metrics, _ in results] \
+        == [1, 1]
+    assert results[1][2][0].snapshot()["lookup"]["latency"]["count"] == 1
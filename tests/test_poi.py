@@ -69,3 +69,13 @@ def test_summary_lookup():
         m.post("https://api.askiggy.com/v1/points_of_interest",
                json=test_response)
         assert curr_api.points_of_interest(poi_post_object) == test_response
+
+
+def test_poi_post_sends_params_and_feature():
+    feature = {"type": "Feature", "properties": {}, "geometry": body["geojson"]}
+    with requests_mock.Mocker() as m:
+        m.post("https://api.askiggy.com/v1/points_of_interest", json=test_response)
+        curr_api.points_of_interest({"method": "POST", "params": {"labels": "warehouses"}},
+                                    feature)
+    assert m.last_request.qs == {"labels": ["warehouses"]}
+    assert m.last_request.json() == feature
@@ -0,0 +1,45 @@
+from unittest.mock import MagicMock
+
+import numpy as np
+
+import iggyapi.api as api
+from iggyapi.poiindex import POIIndex, fetch_tile, tile_calls, tile_polygon, tiles_covering
+
+pois = {
+    "bars": [
+        {"name": "A", "longitude": -93.27, "latitude": 44.98},
+        {"name": "B", "longitude": -93.26, "latitude": 44.98},
+        {"name": "C", "longitude": -93.20, "latitude": 44.98},
+    ],
+}
+
+
+def test_tiles_covering():
+    lngs, lats = np.array([0.01, 0.02, np.nan]), np.array([0.01, 0.01, 0.0])
+    tiles, ranges = tiles_covering(lngs, lats, within_miles=1, tile_degrees=0.05)
+    assert tiles == [(-1, -1), (-1, 0), (0, -1), (0, 0)]
+    assert np.isnan(ranges[2]).all()
+    assert tile_polygon(1, 2, 0.5)["coordinates"][0][2] == [1.0, 1.5]
+
+
+def test_poiindex_distances():
+    index = POIIndex({"bars": pois["bars"] * 2})
+    lngs, lats = np.array([-93.27, -93.0, np.nan]), np.array([44.98, 44.98, 44.98])
+    near, far, missing = index.distances("bars", lngs, lats, within_miles=1)
+    assert near.tolist() == [0.0, 0.49]
+    assert far.size == missing.size == 0
+    assert all(d.size == 0 for d in index.distances("cafes", lngs, lats, 1))
+
+
+def test_fetch_tile_and_from_responses():
+    curr_api = api.IggyAPI("test_string")
+    curr_api.points_of_interest = MagicMock(return_value=pois)
+    calls = tile_calls([(0, 0), (1, 0)], labels=["bars"])
+    assert calls == [((0, 0), "labels", ["bars"]), ((1, 0), "labels", ["bars"])]
+    response = fetch_tile(curr_api, *calls[0], tile_degrees=1)
+    options, body = curr_api.points_of_interest.call_args.args
+    assert options == {"method": "POST", "params": {"labels": "bars"}}
+    assert body == {"type": "Feature", "properties": {}, "geometry": tile_polygon(0, 0, 1)}
+
+    index = POIIndex.from_responses(calls, [response, {"message": "error"}])
+    assert len(index.coordinates["bars"]) == 3
@@ -0,0 +1,129 @@
+import time
+
+import pytest
+import requests
+import requests_mock
+
+import iggyapi.api as api
+from iggyapi.metrics import Histogram
+from iggyapi.ratelimit import HedgePolicy, RateLimiter, RetryPolicy, parse_retry_after
+
+test_response = {
+    "score": 4
+}
+
+amenities_object = {
+    "method": "GET",
+    "params": {
+        "latitude": 44.976469,
+        "longitude": -93.271205,
+        "within_minutes_driving": 3,
+    },
+}
+
+url = "https://api.askiggy.com/v1/amenities_score"
+
+
+@pytest.fixture
+def sleeps(monkeypatch):
+    calls = []
+    monkeypatch.setattr(time, "sleep", calls.append)
+    return calls
+
+
+def test_retry_then_success(sleeps):
+    curr_api = api.IggyAPI("test_string", retry=RetryPolicy(backoff_factor=0.1))
+    with requests_mock.Mocker() as m:
+        m.get(url, [{"status_code": 503, "text": "unavailable"},
+                    {"status_code": 429, "json": {"message": "slow down"},
+                     "headers": {"Retry-After": "7"}},
+                    {"json": test_response}])
+        assert curr_api.amenities_score(amenities_object) == test_response
+        assert m.call_count == 3
+    assert sleeps[0] <= 0.1
+    assert sleeps[1] == 7
+    assert curr_api.metrics.snapshot()["amenities_score"]["retries"] == 2
+    assert curr_api.metrics.snapshot()["amenities_score"]["throttled"] == 1
+
+
+def test_retry_gives_up(sleeps):
+    curr_api = api.IggyAPI("test_string", retry=RetryPolicy(max_retries=2))
+    with requests_mock.Mocker() as m:
+        m.get(url, status_code=502, text="<html>bad gateway</html>", reason="Bad Gateway")
+        result = curr_api.amenities_score(amenities_object)
+        assert m.call_count == 3
+    assert result == {"message": "HTTP 502: Bad Gateway", "status_code": 502}
+    assert curr_api.metrics.snapshot()["amenities_score"]["failures"] == 1
+
+
+def test_no_retry_on_client_error(sleeps):
+    curr_api = api.IggyAPI("test_string")
+    with requests_mock.Mocker() as m:
+        m.get(url, status_code=400, json={"message": "Invalid location."})
+        result = curr_api.amenities_score(amenities_object)
+        assert m.call_count == 1
+    assert result == {"message": "Invalid location.", "status_code": 400}
+
+
+def test_retry_connection_error(sleeps):
+    curr_api = api.IggyAPI("test_string", retry=RetryPolicy(max_retries=1))
+    with requests_mock.Mocker() as m:
+        m.get(url, exc=requests.ConnectionError)
+        with pytest.raises(requests.ConnectionError):
+            curr_api.amenities_score(amenities_object)
+        assert m.call_count == 2
+
+
+def test_rate_limiter(sleeps):
+    limiter = RateLimiter(rate=10, burst=2)
+    for _ in range(4):
+        limiter.acquire()
+    assert len(sleeps) == 2
+    assert sleeps[-1] == pytest.approx(0.2, abs=0.01)
+
+    limiter.throttle(retry_after=5)
+    assert limiter.rate == 5
+    # concurrent 429s from the same throttling event cut the rate once
+    for _ in range(15):
+        limiter.throttle(retry_after=5)
+    assert limiter.rate == 5
+    limiter.acquire()
+    assert sleeps[-1] == pytest.approx(5, abs=0.01)
+    for _ in range(100):
+        limiter.recover()
+    assert limiter.rate == 10
+
+
+def test_parse_retry_after():
+    assert parse_retry_after("3") == 3
+    assert parse_retry_after(None) is None
+    assert parse_retry_after("Wed, 21 Oct 2015 07:28:00 GMT") == 0
+    assert parse_retry_after("soon") is None
+
+
+def test_hedge_policy_delay():
+    latency = Histogram(buckets=(0.1, 0.2, 0.4))
+    policy = HedgePolicy(quantile=0.95, min_samples=10, endpoints=("isochrone",))
+    for v in [0.05] * 5:
+        latency.observe(v)
+    assert policy.delay("isochrone", latency) is None
+    for v in [0.05] * 4 + [0.3]:
+        latency.observe(v)
+    assert 0.2 < policy.delay("isochrone", latency) <= 0.4
+    assert policy.delay("lookup", latency) is None
+    assert HedgePolicy(min_delay=1.0, min_samples=1).delay("lookup", latency) == 1.0
+
+
+def test_rate_limiter_cuts_rate_once_per_window(monkeypatch):
+    now = [100.0]
+    monkeypatch.setattr(time, "monotonic", lambda: now[0])
+    limiter = RateLimiter(rate=50)
+    for _ in range(16):
+        limiter.throttle()
+    assert limiter.rate == 25
+    now[0] += 0.5
+    limiter.throttle()
+    assert limiter.rate == 25
+    now[0] += 1
+    limiter.throttle()
+    assert limiter.rate == 12.5
@@ -0,0 +1,77 @@
+from unittest.mock import MagicMock
+
+import pandas as pd
+import pytest
+
+import iggyapi.api as api
+from iggyapi.iggyfeature import IggyAmenitiesScoreFeature, IggyFeatureSet
+
+test_df = pd.DataFrame(
+    {
+        'id': list(range(10)),
+        'lat': [27.0 + i / 100 for i in range(10)],
+        'lng': [-82.0] * 10,
+    }
+)
+
+
+def make_feature_set():
+    local_api = api.IggyAPI("test_token")
+    local_api.enrich = MagicMock(
+        side_effect=lambda endpoint, options, **kwargs: {"score": options["params"]["latitude"]})
+    f = IggyAmenitiesScoreFeature(local_api, within_minutes_driving=10)
+    return IggyFeatureSet([f]), local_api
+
+
+def test_enrich_csv_in_chunks(tmp_path):
+    input_path = str(tmp_path / "in.csv")
+    output_path = str(tmp_path / "out.csv")
+    test_df.to_csv(input_path, index=False)
+    fs, local_api = make_feature_set()
+
+    assert fs.enrich_file(input_path, output_path, 'lng', 'lat', chunksize=3) == 10
+    out = pd.read_csv(output_path)
+    assert list(out.id) == list(test_df.id)
+    assert list(out.amenities_minutes_driving_10) == list(test_df.lat)
+
+    # a completed job is not re-run
+    assert fs.enrich_file(input_path, output_path, 'lng', 'lat', chunksize=3) == 10
+    assert local_api.enrich.call_count == 10
+
+
+def test_enrich_csv_resumes_after_crash(tmp_path):
+    input_path = str(tmp_path / "in.csv")
+    output_path = str(tmp_path / "out.csv")
+    test_df.to_csv(input_path, index=False)
+    fs, local_api = make_feature_set()
+    enrich = local_api.enrich.side_effect
+
+    def crash_on_row_8(endpoint, options, **kwargs):
+        if options["params"]["latitude"] == test_df.lat[7]:
+            raise RuntimeError("worker died")
+        return enrich(endpoint, options)
+
+    local_api.enrich.side_effect = crash_on_row_8
+    with pytest.raises(RuntimeError):
+        fs.enrich_file(input_path, output_path, 'lng', 'lat', chunksize=3)
+    assert len(pd.read_csv(output_path)) == 6
+
+    local_api.enrich.reset_mock(side_effect=True)
+    local_api.enrich.side_effect = enrich
+    assert fs.enrich_file(input_path, output_path, 'lng', 'lat', chunksize=3) == 10
+    assert local_api.enrich.call_count == 4
+    out = pd.read_csv(output_path)
+    assert list(out.id) == list(test_df.id)
+
+
+def test_enrich_parquet_in_chunks(tmp_path):
+    pytest.importorskip("pyarrow")
+    input_path = str(tmp_path / "in.parquet")
+    output_path = str(tmp_path / "out.parquet")
+    test_df.to_parquet(input_path)
+    fs, _ = make_feature_set()
+
+    assert fs.enrich_file(input_path, output_path, 'lng', 'lat', chunksize=4) == 10
+    out = pd.read_parquet(output_path)
+    assert sorted(out.id) == list(test_df.id)
+    assert len(out.columns) == 4